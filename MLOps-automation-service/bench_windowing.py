@@ -0,0 +1,77 @@
+# bench_windowing.py - Compare the old list-append window loop with windowing.py
+#
+# Usage: python bench_windowing.py [days] [repeats]
+# Uses a synthetic normalized daily series; includes the DataLoader-style
+# batch gather so the cost of non-contiguous views is counted too.
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+
+from data_pipeline import T_IN, T_OUT
+from windowing import sliding_windows
+
+
+def loop_path(normalized, t_in=T_IN, t_out=T_OUT):
+    """
+    The windowing previously done in data_pipeline.prepare_tensors, unchanged:
+    its range dropped the last window, so it yields one window fewer.
+    """
+    X, y = [], []
+    for i in range(len(normalized) - t_in - t_out):
+        X.append(normalized[i : i + t_in])
+        y.append(normalized[i + t_in : i + t_in + t_out])
+    return torch.tensor(np.array(X), dtype=torch.float32), torch.tensor(np.array(y), dtype=torch.float32)
+
+
+def view_path(normalized, t_in=T_IN, t_out=T_OUT):
+    return sliding_windows(normalized, t_in, t_out)
+
+
+def bench(fn, series, repeats):
+    fn(series)  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(series)
+    per_call_ms = (time.perf_counter() - started) / repeats * 1000
+
+    tracemalloc.start()
+    fn(series)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call_ms, peak / 1024
+
+
+def gather_ms(X, repeats, batch_size=64):
+    """Per-batch cost of indexing random rows, as DataLoader(shuffle=True) does."""
+    index = torch.randperm(len(X))[:batch_size]
+    started = time.perf_counter()
+    for _ in range(repeats):
+        X[index].unsqueeze(-1)
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 365 + 4
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = np.random.default_rng(0)
+    series = rng.standard_normal(days).astype(np.float32)
+
+    old, new = loop_path(series), view_path(series)
+    # Same windows, plus the final one the old loop skipped
+    assert len(new[0]) == len(old[0]) + 1
+    assert torch.equal(old[0], new[0][:-1]) and torch.equal(old[1], new[1][:-1])
+
+    # Distinct tensor storages backing X and y (the views share the series buffer)
+    for name, fn in [("loop", loop_path), ("windowing", view_path)]:
+        ms, peak_kib = bench(fn, series, repeats)
+        X, y = fn(series)
+        storages = {t.untyped_storage().data_ptr(): t.untyped_storage().nbytes() for t in (X, y)}
+        owned = sum(storages.values()) / 1024
+        print(
+            f"{name:10s} {days} days: {ms:8.3f} ms/build, peak alloc {peak_kib:9.1f} KiB, "
+            f"tensor storage {owned:9.1f} KiB, batch gather {gather_ms(X, 200):.3f} ms"
+        )
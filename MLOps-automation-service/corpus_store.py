@@ -0,0 +1,176 @@
+# corpus_store.py - Columnar on-disk store of the multi-location training corpus
+#
+# Layout under CORPUS_DIR (one pair of columns per param and ingest):
+#   {param}.{generation}.dates.npy   int32 days since 1970-01-01, all series back to back
+#   {param}.{generation}.values.npy  float32 cleaned values, same order
+#   index.db   SQLite: (param, location) -> lat, lon, date range, offset, length,
+#              plus the current generation per param
+#
+# Columns are written once per ingest and read with np.load(mmap_mode="r"), so
+# training only pages in the slices it touches. A new generation's files are
+# complete before the index switches to it (one transaction), so readers
+# always see columns and offsets that belong together.
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+import numpy as np
+
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join("models", "corpus"))
+
+
+def location_key(lat, lon):
+    return f"{float(lat):.4f},{float(lon):.4f}"
+
+
+class CorpusStore:
+    def __init__(self, directory=CORPUS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _connect(self):
+        return sqlite3.connect(self._path("index.db"), timeout=30)
+
+    def _ensure_schema(self):
+        if self._ready:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS series ("
+                "param TEXT NOT NULL, location TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL, "
+                "start_day INTEGER NOT NULL, end_day INTEGER NOT NULL, "
+                "offset INTEGER NOT NULL, length INTEGER NOT NULL, ingested_at REAL NOT NULL, "
+                "PRIMARY KEY (param, location))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS series_range ON series (param, start_day, end_day)")
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (param TEXT PRIMARY KEY, generation TEXT NOT NULL)")
+        self._ready = True
+
+    def _save_column(self, name, array):
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def generation(self, param):
+        if not os.path.exists(self._path("index.db")):
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT generation FROM generations WHERE param = ?", (param,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def write(self, param, series):
+        """
+        Replace the corpus for `param` with `series`: [(lat, lon, days, values), ...]
+        where `days` are days since 1970-01-01, sorted.
+        """
+        self._ensure_schema()
+        series = [s for s in series if len(s[2])]
+        rows, offset = [], 0
+        now = time.time()
+        for lat, lon, days, values in series:
+            rows.append((
+                param, location_key(lat, lon), float(lat), float(lon),
+                int(days[0]), int(days[-1]), offset, len(days), now,
+            ))
+            offset += len(days)
+        dates = np.concatenate([np.asarray(s[2], dtype="<i4") for s in series]) if series else np.zeros(0, "<i4")
+        values = np.concatenate([np.asarray(s[3], dtype="<f4") for s in series]) if series else np.zeros(0, "<f4")
+        generation = f"{int(now * 1000)}"
+        with self._lock:
+            previous = self.generation(param)
+            self._save_column(f"{param}.{generation}.dates.npy", dates)
+            self._save_column(f"{param}.{generation}.values.npy", values)
+            with self._connect() as conn:
+                conn.execute("DELETE FROM series WHERE param = ?", (param,))
+                conn.executemany("INSERT INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("INSERT OR REPLACE INTO generations VALUES (?, ?)", (param, generation))
+            # Open memory maps of the old generation stay valid after unlinking
+            if previous and previous != generation:
+                for column in ("dates", "values"):
+                    try:
+                        os.remove(self._path(f"{param}.{previous}.{column}.npy"))
+                    except OSError:
+                        pass
+        logging.info(f"[{param}] Corpus written: {len(rows)} series, {len(values)} values.")
+        return len(rows)
+
+    def _snapshot(self, param, start_day=None, end_day=None):
+        """(generation, index rows) read in one transaction so they belong together."""
+        if not os.path.exists(self._path("index.db")):
+            return None, []
+        sql = "SELECT location, lat, lon, start_day, end_day, offset, length FROM series WHERE param = ?"
+        args = [param]
+        if start_day is not None:
+            sql += " AND end_day >= ?"
+            args.append(int(start_day))
+        if end_day is not None:
+            sql += " AND start_day <= ?"
+            args.append(int(end_day))
+        keys = ("location", "lat", "lon", "start_day", "end_day", "offset", "length")
+        conn = sqlite3.connect(self._path("index.db"), timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            row = conn.execute("SELECT generation FROM generations WHERE param = ?", (param,)).fetchone()
+            rows = conn.execute(sql + " ORDER BY offset", args).fetchall()
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            return None, []
+        finally:
+            conn.close()
+        if row is None:
+            return None, []
+        return row[0], [dict(zip(keys, r)) for r in rows]
+
+    def index(self, param, start_day=None, end_day=None):
+        """Index rows for `param` whose series overlap [start_day, end_day]."""
+        return self._snapshot(param, start_day, end_day)[1]
+
+    def columns(self, param, generation=None):
+        """Memory-mapped (dates, values) columns for `param`, or (None, None)."""
+        generation = generation or self.generation(param)
+        if generation is None:
+            return None, None
+        try:
+            return (
+                np.load(self._path(f"{param}.{generation}.dates.npy"), mmap_mode="r"),
+                np.load(self._path(f"{param}.{generation}.values.npy"), mmap_mode="r"),
+            )
+        except (OSError, ValueError):
+            return None, None
+
+    def read(self, param, start_day=None, end_day=None):
+        """[(entry, dates, values), ...] memory-mapped slices clipped to [start_day, end_day]."""
+        # A concurrent write may remove the generation just looked up: retry once
+        for _ in range(2):
+            generation, entries = self._snapshot(param, start_day, end_day)
+            if generation is None:
+                return []
+            dates, values = self.columns(param, generation)
+            if dates is not None:
+                break
+        else:
+            return []
+        found = []
+        for entry in entries:
+            lo, hi = entry["offset"], entry["offset"] + entry["length"]
+            d = dates[lo:hi]
+            first = 0 if start_day is None else int(np.searchsorted(d, start_day, side="left"))
+            last = len(d) if end_day is None else int(np.searchsorted(d, end_day, side="right"))
+            found.append((entry, d[first:last], values[lo + first:lo + last]))
+        return found
+
+
+store = CorpusStore()
@@ -2,9 +2,13 @@ import requests
 import pandas as pd
 import numpy as np
 import torch
-from io import StringIO
+from torch.utils.data import Dataset, DataLoader, Subset
 from datetime import datetime, timedelta
 
+import nasa_client
+import nasa_parser
+from windowing import sliding_windows, window_count
+
 # --- CONFIGURATION ---
 T_IN = 60
 T_OUT = 10
@@ -13,40 +17,37 @@ NASA_API_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
 # Bangalore Rural
 LOCATION = {"lat": 13.18, "lon": 77.8} 
 
-def fetch_data(param="T2M", days=5*365+4):
+def fetch_frames(params, days=5*365+4, lat=LOCATION["lat"], lon=LOCATION["lon"]):
     """
-    Ingestion: Fetch last N days of data from NASA POWER API.
+    Ingestion: Fetch last N days of several params for one location in a single
+    NASA POWER request. Returns {param: DataFrame}.
     """
-    print(f"[Ingestion] Fetching last {days} days of {param} data...")
     now = datetime.now()
     start_date = now - timedelta(days=days)
     
     url = (
         f"{NASA_API_URL}?"
-        f"parameters={param}&community=AG&longitude={LOCATION['lon']}&latitude={LOCATION['lat']}"
+        f"parameters={','.join(params)}&community=AG&longitude={lon}&latitude={lat}"
         f"&start={start_date.strftime('%Y%m%d')}&end={now.strftime('%Y%m%d')}&format=CSV"
     )
     
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        text = nasa_client.get_text(url)
     except requests.exceptions.RequestException as e:
         print(f"[Ingestion] Failed to fetch data: {e}")
         raise e
 
-    df = pd.read_csv(StringIO(response.text), skiprows=9)
-    df.columns = [c.strip() for c in df.columns]
-    
-    # Create Date Index
-    df["Date"] = pd.to_datetime(
-        df["YEAR"].astype(str) + df["DOY"].astype(str).str.zfill(3),
-        format="%Y%j"
-    )
-    df.set_index("Date", inplace=True)
-    df = df.sort_index()
-    
-    # Rename value column to 'Value' for generic handling
-    df.rename(columns={param: "Value"}, inplace=True)
+    # Parse straight to arrays (-999 arrives as NaN) and index by date
+    dates, values = nasa_parser.parse_csv(text, params)
+    index = pd.DatetimeIndex(dates.astype("datetime64[D]"), name="Date")
+    return {param: pd.DataFrame({"Value": values[param]}, index=index).sort_index() for param in params}
+
+def fetch_data(param="T2M", days=5*365+4):
+    """
+    Ingestion: Fetch last N days of data from NASA POWER API.
+    """
+    print(f"[Ingestion] Fetching last {days} days of {param} data...")
+    df = fetch_frames([param], days)[param]
     
     print(f"[Ingestion] Retrieved {len(df)} records.")
     return df
@@ -96,6 +97,11 @@ def compute_stats(df):
     print(f"[EDA] Data Stats: {stats}")
     return stats
 
+def normalize(series):
+    mean = series.mean()
+    std = series.std() if series.std() > 0 else 1.0
+    return (series - mean) / std, mean, std
+
 def prepare_tensors(df):
     """
     Feature Engineering: Normalize and create sliding windows.
@@ -105,28 +111,124 @@ def prepare_tensors(df):
     series = df["Value"].values.astype(np.float32)
     
     # Normalization
-    mean = series.mean()
-    std = series.std() if series.std() > 0 else 1.0
-    normalized = (series - mean) / std
+    normalized, mean, std = normalize(series)
     
-    # Sliding Windows
-    X, y = [], []
-    for i in range(len(normalized) - T_IN - T_OUT):
-        X.append(normalized[i : i + T_IN])
-        y.append(normalized[i + T_IN : i + T_IN + T_OUT])
-        
-    X = np.array(X)
-    y = np.array(y)
-    
-    X_tensor = torch.tensor(X, dtype=torch.float32)
-    y_tensor = torch.tensor(y, dtype=torch.float32)
+    # Sliding Windows (strided views over `normalized`, no per-window copies)
+    X_tensor, y_tensor = sliding_windows(normalized, T_IN, T_OUT)
     
     # Temporal Info (0 to T_IN-1) repeated for batch
     temporal_info = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(X_tensor.size(0), -1)
     
-    print(f"[Feature Engineering] Created {len(X)} windows. Shape: {X_tensor.shape}")
+    print(f"[Feature Engineering] Created {len(X_tensor)} windows. Shape: {X_tensor.shape}")
     return X_tensor, y_tensor, temporal_info, mean, std
 
+class WindowedSeriesDataset(Dataset):
+    """
+    (x [T_IN], y [T_OUT], t [T_IN]) training windows cut on demand from one or
+    more normalized 1-D series (e.g. one per location). Only the series are
+    kept in memory; windows never span two series.
+
+    `__getitems__` gathers a whole batch with one indexing op and returns the
+    batched (x, y, t) tensors; use `batch_loader` to iterate it.
+    """
+
+    def __init__(self, series, t_in=T_IN, t_out=T_OUT, stride=1):
+        if isinstance(series, np.ndarray) and series.ndim == 1:
+            series = [series]
+        parts = [np.asarray(s, dtype=np.float32).ravel() for s in series]
+        self.t_in, self.t_out, self.stride = t_in, t_out, stride
+        self.span = t_in + t_out
+        self.values = torch.from_numpy(np.concatenate(parts) if parts else np.zeros(0, np.float32))
+        lengths = np.array([len(p) for p in parts], dtype=np.int64)
+        # Where each series starts in `values` and in the window index space
+        self.bases = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        self.counts = np.array([window_count(n, t_in, t_out, stride) for n in lengths], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)]).astype(np.int64)
+        self._steps = torch.arange(self.span)
+        self._temporal = torch.arange(t_in, dtype=torch.float32)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _starts(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError(f"Window index out of range for {len(self)} windows")
+        which = np.searchsorted(self.offsets, indices, side="right") - 1
+        return torch.from_numpy(self.bases[which] + (indices - self.offsets[which]) * self.stride)
+
+    def __getitems__(self, indices):
+        windows = self.values[self._starts(indices)[:, None] + self._steps]
+        return (
+            windows[:, :self.t_in],
+            windows[:, self.t_in:],
+            self._temporal.expand(len(windows), -1),
+        )
+
+    def __getitem__(self, index):
+        x, y, t = self.__getitems__([index])
+        return x[0], y[0], t[0]
+
+    def split(self, fraction=0.8):
+        """Chronological (train, test) Subsets: the first `fraction` of each series' windows train."""
+        train, test = [], []
+        for offset, count in zip(self.offsets[:-1], self.counts):
+            cut = int(fraction * count)
+            train.extend(range(offset, offset + cut))
+            test.extend(range(offset + cut, offset + count))
+        return Subset(self, train), Subset(self, test)
+
+
+def _batch(batch):
+    # __getitems__ already returns the collated batch
+    return batch
+
+
+def batch_loader(dataset, batch_size, shuffle=False):
+    """DataLoader yielding (x, y, t) batches gathered by WindowedSeriesDataset.__getitems__."""
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, collate_fn=_batch)
+
+
+def prepare_dataset(frames):
+    """
+    Feature Engineering (lazy): normalize each frame's series and wrap them in a
+    WindowedSeriesDataset. Returns: dataset, mean, std (lists for several frames).
+    """
+    single = isinstance(frames, pd.DataFrame)
+    normalized, means, stds = [], [], []
+    for df in [frames] if single else frames:
+        series, mean, std = normalize(df["Value"].values.astype(np.float32))
+        normalized.append(series)
+        means.append(mean)
+        stds.append(std)
+    dataset = WindowedSeriesDataset(normalized)
+    print(f"[Feature Engineering] {len(dataset)} windows over {len(normalized)} series "
+          f"({dataset.values.numel()} values kept in memory).")
+    if single:
+        return dataset, means[0], stds[0]
+    return dataset, means, stds
+
+def prepare_corpus_dataset(param="T2M", start_day=None, end_day=None):
+    """
+    Feature Engineering (lazy) over the multi-location corpus built by
+    ingest_corpus.py. Returns: dataset, means, stds (one per location), or
+    None if the corpus has no series for `param`.
+    """
+    from corpus_store import store
+    found = store.read(param, start_day, end_day)
+    if not found:
+        return None
+    normalized, means, stds = [], [], []
+    for _, _, values in found:
+        # Normalizing reads each memory-mapped slice once
+        series, mean, std = normalize(np.asarray(values, dtype=np.float32))
+        normalized.append(series)
+        means.append(mean)
+        stds.append(std)
+    dataset = WindowedSeriesDataset(normalized)
+    print(f"[Feature Engineering] Corpus: {len(dataset)} windows over {len(normalized)} locations.")
+    return dataset, means, stds
+
 def run_pipeline(param="T2M"):
     """
     Pipeline entrypoint: Fetch -> Clean -> Stats -> Tensor Prep.
@@ -135,3 +237,12 @@ def run_pipeline(param="T2M"):
     df = validate_and_clean(df, param)
     stats = compute_stats(df)
     return prepare_tensors(df)
+
+def run_dataset_pipeline(param="T2M"):
+    """
+    Pipeline entrypoint for training: Fetch -> Clean -> Stats -> lazy Dataset.
+    """
+    df = fetch_data(param)
+    df = validate_and_clean(df, param)
+    stats = compute_stats(df)
+    return prepare_dataset(df)
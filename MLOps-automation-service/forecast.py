@@ -1,14 +1,11 @@
-import requests
-import pandas as pd
-import numpy as np
 import logging
-from io import StringIO
 from datetime import datetime, timedelta
 import torch
 
 from model_loader import load_model
-from model_evaluator import evaluate_model_health
-from retraining_service import attempt_retrain
+import nasa_client
+import nasa_parser
+import health_monitor
 
 #
 T_IN = 60       # Look-back window
@@ -26,19 +23,11 @@ def fetch_nasa_data(lat, lon, param="T2M"):
         f"&start={start.strftime('%Y%m%d')}&end={now.strftime('%Y%m%d')}&format=CSV"
     )
 
-    response = requests.get(url)
-    response.raise_for_status()
+    text = nasa_client.get_text(url)
 
-    df = pd.read_csv(StringIO(response.text), skiprows=9)
-    df.columns = [c.strip() for c in df.columns]
-
-    df["Date"] = pd.to_datetime(
-        df["YEAR"].astype(str) + df["DOY"].astype(str).str.zfill(3),
-        format="%Y%j"
-    )
-    df.set_index("Date", inplace=True)
-
-    return df[param].values.astype(np.float32)
+    # Unpublished trailing days are dropped, interior gaps interpolated
+    _, values = nasa_parser.parse_csv(text, [param])
+    return nasa_parser.fill_gaps(values[param])
 
 
 def preprocess_series(series):
@@ -78,25 +67,17 @@ def postprocess(pred_norm, mean, std):
 def run_forecast(lat, lon, param="T2M"):
     """
     Main function called by app.py
-    Fetch → Validate/Retrain → preprocess → run model → postprocess → return JSON
+    Fetch → preprocess → run model → postprocess → return JSON
     """
     
     # ---------------------------------------------------------
-    # CONDITIONAL RETRAINING / VALIDATION CHECK
-    # ---------------------------------------------------------
-    # Per requirements: "whenever we make a prediction... first take last 70 days..."
-    
-    is_healthy, _ = evaluate_model_health(param)
-    
-    if not is_healthy:
-        logging.info(f"[{param}] Model detected as UNHEALTHY. Initiating conditional retraining...")
-        success = attempt_retrain(param)
-        if not success:
-            logging.error(f"[{param}] Retraining failed or abandoned. Proceeding with best effort prediction.")
-    
-    # ---------------------------------------------------------
-    # FORECASTING
+    # MODEL HEALTH (cached, off the request path)
     # ---------------------------------------------------------
+    # The "last 70 days" validation runs in the background via health_monitor;
+    # an unhealthy verdict enqueues a retrain instead of holding this request.
+    health = health_monitor.get_health(param)
+    if health is not None and not health["healthy"]:
+        logging.warning(f"[{param}] Model last checked UNHEALTHY (MAE={health['mae']:.4f}); retraining is scheduled.")
     
     # ---------------------------------------------------------
     # FORECASTING
@@ -0,0 +1,121 @@
+# health_monitor.py - Cached model health, refreshed off the request path
+#
+# evaluate_model_health is a 75-day NASA fetch plus a model forward, and a
+# failing verdict means up to MAX_RETRIES full trainings. Neither belongs in a
+# forecast request: requests read the last verdict from this cache, stale or
+# missing verdicts are refreshed in a background thread, and an unhealthy
+# verdict enqueues a job on retrain_queue.
+
+import os
+import time
+import logging
+import threading
+
+from model_evaluator import evaluate_model_health
+import model_loader
+import retrain_queue
+
+# A verdict older than this is refreshed (in the background) on next use
+HEALTH_TTL_SECONDS = float(os.getenv("HEALTH_TTL_SECONDS", "3600"))
+# Period of the background refresher (start(), run by retrain_api.py); 0 disables it
+HEALTH_REFRESH_SECONDS = float(os.getenv("HEALTH_REFRESH_SECONDS", str(HEALTH_TTL_SECONDS)))
+
+_lock = threading.Lock()
+_health = {}         # param -> {"healthy", "mae", "checked_at"}
+_refreshing = set()  # params with a health check running
+_stats = {"refreshes": 0, "refresh_errors": 0, "retrains_enqueued": 0, "retrains_deduped": 0}
+
+
+def get_health(param):
+    """
+    Last verdict for `param` ({"healthy", "mae", "checked_at"}) or None if
+    never checked. Never blocks: a missing or stale verdict schedules a refresh.
+    """
+    with _lock:
+        state = _health.get(param)
+    if state is None or time.time() - state["checked_at"] > HEALTH_TTL_SECONDS:
+        refresh_async(param)
+    return dict(state) if state else None
+
+
+def refresh(param):
+    """Evaluate `param` now, cache the verdict and enqueue a retrain if unhealthy."""
+    try:
+        is_healthy, mae = evaluate_model_health(param)
+    except Exception as e:
+        logging.error(f"[{param}] Health check failed: {e}")
+        with _lock:
+            _stats["refresh_errors"] += 1
+        return None
+    state = {"healthy": bool(is_healthy), "mae": float(mae), "checked_at": time.time()}
+    with _lock:
+        _health[param] = state
+        _stats["refreshes"] += 1
+    if not is_healthy:
+        logging.info(f"[{param}] Model detected as UNHEALTHY (MAE={mae:.4f}). Scheduling retraining.")
+        enqueue_retrain(param)
+    return dict(state)
+
+
+def refresh_async(param):
+    """Run refresh(param) in a background thread unless one is already running."""
+    with _lock:
+        if param in _refreshing:
+            return False
+        _refreshing.add(param)
+
+    def _run():
+        try:
+            refresh(param)
+        finally:
+            with _lock:
+                _refreshing.discard(param)
+
+    threading.Thread(target=_run, name=f"health-{param}", daemon=True).start()
+    return True
+
+
+# --- RETRAINING ---
+
+def enqueue_retrain(param):
+    """Queue a retrain for `param` on retrain_queue; returns at once, deduplicated per param."""
+    _, created = retrain_queue.queue.enqueue(param, source="health_monitor")
+    with _lock:
+        _stats["retrains_enqueued" if created else "retrains_deduped"] += 1
+    retrain_queue.start_workers(on_finished=on_retrain_finished)
+    return created
+
+
+def on_retrain_finished(job):
+    # Serve the new (or reverted) weights and re-check on next use
+    model_loader.unload_model(job["param"])
+    with _lock:
+        _health.pop(job["param"], None)
+
+
+# --- BACKGROUND REFRESHER ---
+
+def start(params, interval=None):
+    """Refresh every param every `interval` seconds (HEALTH_REFRESH_SECONDS) in a daemon thread."""
+    interval = HEALTH_REFRESH_SECONDS if interval is None else interval
+    if interval <= 0:
+        return None
+
+    def _loop():
+        while True:
+            for param in params:
+                refresh_async(param)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_loop, name="health-refresher", daemon=True)
+    thread.start()
+    return thread
+
+
+def stats():
+    with _lock:
+        return {
+            **_stats,
+            "refreshing": sorted(_refreshing),
+            "health": {p: dict(s) for p, s in _health.items()},
+        }
@@ -0,0 +1,176 @@
+# ingest_corpus.py - Build the multi-location training corpus (corpus_store)
+#
+# Fetches every configured location concurrently (one NASA POWER request per
+# location covers all properties), cleans each series with
+# data_pipeline.validate_and_clean and writes one columnar corpus per property.
+# INGEST_WORKERS bounds the concurrent requests and INGEST_RATE (requests per
+# second) keeps the job polite to the public API; nasa_client still handles
+# retries and backoff.
+#
+# Locations come from CORPUS_LOCATIONS (JSON file with [{"lat": .., "lon": ..}])
+# and/or CORPUS_GRID ("lat_min,lat_max,lon_min,lon_max,step" in degrees); with
+# neither, the single training LOCATION is used.
+#
+# A failed location keeps its series from the previous corpus. When more than
+# INGEST_MAX_FAILED_FRACTION of the locations fail (e.g. an upstream outage
+# tripped the NASA circuit breaker), nothing is written at all.
+#
+# Usage: python ingest_corpus.py
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from data_pipeline import fetch_frames, validate_and_clean, LOCATION
+from corpus_store import store, location_key
+
+CORPUS_PROPERTIES = [
+    p.strip() for p in os.getenv("CORPUS_PROPERTIES", "T2M,RH2M,WS2M").split(",") if p.strip()
+]
+CORPUS_LOCATIONS = os.getenv("CORPUS_LOCATIONS", os.path.join("models", "corpus_locations.json"))
+CORPUS_GRID = os.getenv("CORPUS_GRID", "")
+CORPUS_DAYS = int(os.getenv("CORPUS_DAYS", str(5 * 365 + 4)))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "8"))
+INGEST_RATE = float(os.getenv("INGEST_RATE", "2"))
+INGEST_MAX_FAILED_FRACTION = float(os.getenv("INGEST_MAX_FAILED_FRACTION", "0.2"))
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def grid_locations(spec):
+    """Every point of a regular lat/lon grid given as "lat_min,lat_max,lon_min,lon_max,step"."""
+    lat_min, lat_max, lon_min, lon_max, step = (float(v) for v in spec.split(","))
+    lats = np.arange(lat_min, lat_max + step / 2, step)
+    lons = np.arange(lon_min, lon_max + step / 2, step)
+    return [{"lat": round(float(lat), 4), "lon": round(float(lon), 4)} for lat in lats for lon in lons]
+
+
+def load_locations():
+    locations = []
+    if os.path.exists(CORPUS_LOCATIONS):
+        with open(CORPUS_LOCATIONS, "r") as f:
+            locations.extend(json.load(f))
+    if CORPUS_GRID:
+        locations.extend(grid_locations(CORPUS_GRID))
+    if not locations:
+        locations.append(dict(LOCATION))
+    # Drop duplicates, keep order
+    return list({(loc["lat"], loc["lon"]): loc for loc in locations}.values())
+
+
+def fetch_location(location, params, days, limiter):
+    """{param: (days since epoch, values)} of cleaned series for one location."""
+    limiter.acquire()
+    frames = fetch_frames(params, days, location["lat"], location["lon"])
+    series = {}
+    for param, df in frames.items():
+        df = validate_and_clean(df, param)
+        series[param] = (
+            df.index.values.astype("datetime64[D]").astype(np.int64).astype(np.int32),
+            df["Value"].values.astype(np.float32),
+        )
+    return series
+
+
+def _previous_series(param):
+    """{location key: (days, values)} copied from the current corpus for `param`."""
+    return {
+        entry["location"]: (np.array(dates), np.array(values))
+        for entry, dates, values in store.read(param)
+    }
+
+
+def ingest(locations, params=CORPUS_PROPERTIES, days=CORPUS_DAYS, workers=INGEST_WORKERS, rate=INGEST_RATE,
+           max_failed_fraction=None):
+    """
+    Fetch, clean and store `locations` for `params`. Returns (stored, failed)
+    location counts; stored is 0 when too many failed and the corpus was kept.
+    """
+    if max_failed_fraction is None:
+        max_failed_fraction = INGEST_MAX_FAILED_FRACTION
+    limiter = RateLimiter(rate, burst=workers)
+    results = [None] * len(locations)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest") as pool:
+        futures = {
+            pool.submit(fetch_location, loc, params, days, limiter): i for i, loc in enumerate(locations)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                failed += 1
+                logging.warning(f"[Ingestion] {locations[i]} failed: {e}")
+            if done % 50 == 0:
+                logging.info(f"[Ingestion] {done}/{len(locations)} locations fetched")
+
+    if locations and failed / len(locations) > max_failed_fraction:
+        # Keep the previous corpus rather than shrinking it by an outage
+        logging.error(
+            f"[Ingestion] {failed}/{len(locations)} locations failed "
+            f"(> {max_failed_fraction:.0%}); corpus left unchanged"
+        )
+        return 0, failed
+    # Written in location order so offsets are stable across runs
+    for param in params:
+        previous = _previous_series(param) if failed else {}
+        series, carried = [], 0
+        for loc, result in zip(locations, results):
+            if result is not None:
+                series.append((loc["lat"], loc["lon"], *result[param]))
+            elif location_key(loc["lat"], loc["lon"]) in previous:
+                series.append((loc["lat"], loc["lon"], *previous[location_key(loc["lat"], loc["lon"])]))
+                carried += 1
+        if carried:
+            logging.warning(f"[{param}] Kept the previous series for {carried} failed locations")
+        store.write(param, series)
+    return len(locations) - failed, failed
+
+
+def main():
+    logging.basicConfig(
+        stream=sys.stdout, level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    locations = load_locations()
+    logging.info(
+        f"Ingesting {len(locations)} locations x {CORPUS_PROPERTIES} "
+        f"({INGEST_WORKERS} workers, {INGEST_RATE}/s)"
+    )
+    started = time.time()
+    stored, failed = ingest(locations)
+    logging.info(f"Corpus: {stored} locations stored, {failed} failed in {time.time() - started:.1f}s")
+    return 0 if stored else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
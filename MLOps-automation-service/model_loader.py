@@ -25,3 +25,7 @@ def load_model(param="T2M"):
         _models[param] = model
     
     return _models[param]
+
+def unload_model(param="T2M"):
+    """Drop the cached model so the next load_model picks up new weights."""
+    _models.pop(param, None)
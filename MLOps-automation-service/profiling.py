@@ -0,0 +1,123 @@
+# profiling.py - Opt-in, rate-limited profiling of hot paths on live pods
+#
+# A profiled section is captured twice:
+#   <name>.pstats      cProfile (Python level; open with pstats / snakeviz)
+#   <name>.trace.json  torch.profiler operator trace (chrome://tracing / Perfetto)
+#
+# Sections are profiled when asked for explicitly (e.g. an X-Profile request
+# header) or by sampling (PROFILE_SAMPLE_RATE). Captures are limited to
+# PROFILE_MAX_PER_MINUTE and one at a time. The oldest traces are deleted once
+# PROFILE_DIR grows past PROFILE_MAX_DIR_MB. Everything is a no-op unless
+# requested.
+
+import os
+import time
+import random
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+
+import torch
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Fraction of eligible calls profiled without being asked (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_PER_MINUTE = int(os.getenv("PROFILE_MAX_PER_MINUTE", "2"))
+PROFILE_MAX_DIR_MB = float(os.getenv("PROFILE_MAX_DIR_MB", "200"))
+
+_lock = threading.Lock()
+# torch.profiler supports one active profile per process
+_active = threading.Lock()
+_recent = []
+# Set on the thread running a capture; work normally handed to other threads
+# (e.g. the micro-batcher) must run inline there to show up in the trace
+_local = threading.local()
+_stats = {"captured": 0, "rate_limited": 0, "busy": 0}
+
+
+def should_profile(requested=False):
+    """True if this call should be profiled (explicit request or sample), within the rate limit."""
+    wanted = requested or (
+        PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    )
+    if not wanted:
+        return False
+    now = time.time()
+    with _lock:
+        _recent[:] = [t for t in _recent if now - t < 60]
+        if len(_recent) >= PROFILE_MAX_PER_MINUTE:
+            _stats["rate_limited"] += 1
+            return False
+        _recent.append(now)
+    return True
+
+
+def capturing():
+    """True on a thread whose work is currently being profiled."""
+    return getattr(_local, "capturing", False)
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def _enforce_size_limit():
+    try:
+        files = [os.path.join(PROFILE_DIR, f) for f in os.listdir(PROFILE_DIR)]
+        files = sorted((os.path.getmtime(f), os.path.getsize(f), f) for f in files if os.path.isfile(f))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    limit = PROFILE_MAX_DIR_MB * 1024 * 1024
+    for _, size, path in files:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+@contextmanager
+def profile(name, enabled=True):
+    """
+    Profile the enclosed block if `enabled`. Yields the trace base path, or None
+    when not profiling (disabled, or another capture is running).
+    """
+    if not enabled:
+        yield None
+        return
+    if not _active.acquire(blocking=False):
+        with _lock:
+            _stats["busy"] += 1
+        yield None
+        return
+
+    base = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+    python_profile = cProfile.Profile()
+    torch_profile = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+    try:
+        torch_profile.__enter__()
+        python_profile.enable()
+        _local.capturing = True
+        try:
+            yield base
+        finally:
+            _local.capturing = False
+            python_profile.disable()
+            torch_profile.__exit__(None, None, None)
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                python_profile.dump_stats(f"{base}.pstats")
+                torch_profile.export_chrome_trace(f"{base}.trace.json")
+                with _lock:
+                    _stats["captured"] += 1
+                logging.info(f"Profile written: {base}.pstats / {base}.trace.json")
+            except (OSError, RuntimeError) as e:
+                logging.warning(f"Could not write profile {base}: {e}")
+            _enforce_size_limit()
+    finally:
+        _active.release()
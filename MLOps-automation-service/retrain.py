@@ -6,7 +6,7 @@ import mlflow
 import mlflow.pyfunc
 
 from model_evaluator import evaluate_model_health
-from retraining_service import attempt_retrain
+import retrain_queue
 #for kibana
 # =============================================
 # CONFIGURATION
@@ -36,6 +36,8 @@ logging.basicConfig(
 # =============================================
 def run_retraining_cycle():
     logging.info("=== DAILY RETRAINING CYCLE STARTED ===")
+    # MLflow run per queued retrain job, to record the outcome once it finishes
+    job_runs = {}
 
     # Setup MLflow
     mlflow.set_tracking_uri(MLFLOW_URI)
@@ -74,18 +76,15 @@ def run_retraining_cycle():
                 # os.environ["ENABLE_RETRAINING"] = "true" 
                 
                 if os.getenv("ENABLE_RETRAINING", "false").lower() == "true":
-                    logging.info(f"[{param}] ENABLE_RETRAINING=true. Starting Automatic Retraining (Heavy Task)...")
+                    logging.info(f"[{param}] ENABLE_RETRAINING=true. Queueing Automatic Retraining (Heavy Task)...")
                     decision = "RETRAIN_ATTEMPTED"
                     mlflow.log_param("retrain_decision", decision)
                     
-                    success = attempt_retrain(param)
-                    mlflow.log_param("retrain_success", success)
+                    # Deduplicated against retrains already queued (e.g. by the health monitor)
+                    job, created = retrain_queue.queue.enqueue(param, source="daily_cycle")
+                    mlflow.log_param("retrain_job_id", job["id"])
+                    job_runs[job["id"]] = mlflow.active_run().info.run_id
                     
-                    if success:
-                         logging.info(f"[{param}] Retrain process COMPLETED successfully.")
-                    else:
-                         logging.error(f"[{param}] Retrain process FAILED after max attempts.")
-                         
                 else:
                     decision = "DRIFT_DETECTED_MANUAL_REQUIRED"
                     logging.warning(f"[{param}] Check MLflow to confirm drift.")
@@ -97,6 +96,24 @@ def run_retraining_cycle():
             logging.error(f"[{param}] ERROR during retraining: {e}")
             logging.error(traceback.format_exc())
 
+    # -------------------------------
+    # Step 3: Wait for the queued retrains
+    # -------------------------------
+    # The retrain API container runs the queue workers (same PVC). This process
+    # only enqueues and waits: a worker here could claim a job queued by
+    # someone else and be killed mid-training when the cycle exits.
+    finished = retrain_queue.queue.wait(list(job_runs))
+    for job_id, run_id in job_runs.items():
+        job = finished[job_id]
+        success = job["status"] == "succeeded"
+        if success:
+            logging.info(f"[{job['param']}] Retrain process COMPLETED successfully.")
+        else:
+            logging.error(f"[{job['param']}] Retrain process FAILED after max attempts ({job['status']}).")
+        if run_id:
+            with mlflow.start_run(run_id=run_id):
+                mlflow.log_param("retrain_success", success)
+
     logging.info("=== DAILY RETRAINING CYCLE FINISHED ===")
 
 
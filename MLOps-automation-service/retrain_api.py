@@ -0,0 +1,58 @@
+from flask import Flask, request, jsonify
+import logging
+import os
+
+import retrain_queue
+import health_monitor
+
+# --- CONFIGURATION ---
+RETRAIN_API_PORT = int(os.getenv("RETRAIN_API_PORT", "5010"))
+PROPERTIES = ["T2M", "RH2M", "WS2M"]
+
+app = Flask(__name__)
+
+
+@app.route("/health")
+def health():
+    return jsonify({"status": "up", "service": "retrain-queue"}), 200
+
+
+@app.route("/retrain", methods=["POST"])
+def retrain():
+    """Queue a retrain and return at once; 202 with the (possibly existing) job."""
+    data = request.json or {}
+    param = data.get("param")
+    if param not in PROPERTIES:
+        return jsonify({"error": f"param must be one of {PROPERTIES}"}), 400
+    job, created = retrain_queue.queue.enqueue(param, source=data.get("source", "api"))
+    return jsonify({"job": job, "created": created}), 202
+
+
+@app.route("/retrain/jobs")
+def jobs():
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({
+        "jobs": retrain_queue.queue.jobs(request.args.get("param"), limit),
+        "max_concurrent": retrain_queue.RETRAIN_MAX_CONCURRENT,
+    }), 200
+
+
+@app.route("/retrain/jobs/<int:job_id>")
+def job(job_id):
+    found = retrain_queue.queue.get(job_id)
+    if found is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(found), 200
+
+
+@app.route("/stats")
+def stats():
+    return jsonify({"health_monitor": health_monitor.stats(), "pending_jobs": retrain_queue.queue.pending()}), 200
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    retrain_queue.start_workers(on_finished=health_monitor.on_retrain_finished)
+    # Keep the cached verdicts fresh (and queue retrains) without waiting for reads
+    health_monitor.start(PROPERTIES)
+    app.run(host="0.0.0.0", port=RETRAIN_API_PORT)
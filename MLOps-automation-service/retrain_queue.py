@@ -0,0 +1,284 @@
+# retrain_queue.py - Persistent background queue for retraining jobs
+#
+# attempt_retrain is minutes of CPU per attempt and overwrites
+# models/latest_{param}.pt, so it must never run twice for the same param at
+# once. Jobs are rows in a SQLite file on the model PVC (they survive restarts):
+#   - enqueue() returns immediately and reuses a queued/running job for the param
+#   - at most RETRAIN_MAX_CONCURRENT trainings run, never two for one param
+#   - progress and status are kept per job and served by retrain_api.py
+#
+# Job status: queued -> running -> succeeded | failed
+#
+# A claimed job holds a lease: its worker renews heartbeat_at every
+# RETRAIN_LEASE_SECONDS / 3. Any process sharing the PVC may requeue a
+# running job only once its lease has expired, and a worker that lost its
+# lease can no longer finish the job.
+
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+RETRAIN_QUEUE_DB = os.getenv("RETRAIN_QUEUE_DB", os.path.join("models", "retrain_queue.db"))
+# Each training holds a model copy plus the dataset and saturates the torch
+# thread pool; size this to the pod's CPU and memory limits.
+RETRAIN_MAX_CONCURRENT = int(os.getenv("RETRAIN_MAX_CONCURRENT", "1"))
+RETRAIN_POLL_SECONDS = float(os.getenv("RETRAIN_POLL_SECONDS", "2"))
+# A running job whose heartbeat is older than this is considered abandoned
+RETRAIN_LEASE_SECONDS = float(os.getenv("RETRAIN_LEASE_SECONDS", "300"))
+
+_COLUMNS = (
+    "id", "param", "status", "progress", "source", "created_at", "started_at", "finished_at", "error",
+    "owner", "heartbeat_at",
+)
+
+
+class RetrainQueue:
+    def __init__(self, path=RETRAIN_QUEUE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _ensure_schema(self):
+        if self._ready:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, param TEXT NOT NULL, status TEXT NOT NULL, "
+                "progress TEXT, source TEXT, created_at REAL NOT NULL, started_at REAL, "
+                "finished_at REAL, error TEXT, owner TEXT, heartbeat_at REAL)"
+            )
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "heartbeat_at" not in existing:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, param)")
+        finally:
+            conn.close()
+        self._ready = True
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside BEGIN IMMEDIATE so concurrent processes serialize."""
+        self._ensure_schema()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn)
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+                return result
+            finally:
+                conn.close()
+
+    def enqueue(self, param, source=None):
+        """Queue a retrain for `param`. Returns (job, created); reuses a queued/running job."""
+        def _enqueue(conn):
+            row = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE param = ? AND status IN ('queued', 'running') "
+                "ORDER BY id LIMIT 1", (param,)
+            ).fetchone()
+            if row:
+                return dict(zip(_COLUMNS, row)), False
+            cursor = conn.execute(
+                "INSERT INTO jobs (param, status, progress, source, created_at) VALUES (?, 'queued', 'queued', ?, ?)",
+                (param, source, time.time()),
+            )
+            return self._get(conn, cursor.lastrowid), True
+
+        job, created = self._transaction(_enqueue)
+        if created:
+            logging.info(f"[{param}] Retrain job {job['id']} queued (source={source}).")
+        return job, created
+
+    def claim(self, max_running=RETRAIN_MAX_CONCURRENT):
+        """
+        Mark the oldest runnable job as running under a new lease and return it
+        (its "owner" is the lease token), or None.
+        """
+        def _claim(conn):
+            running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            if running >= max_running:
+                return None
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND param NOT IN "
+                "(SELECT param FROM jobs WHERE status = 'running') ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, progress = 'starting', "
+                "owner = ? WHERE id = ?",
+                (now, now, uuid.uuid4().hex, row[0]),
+            )
+            return self._get(conn, row[0])
+
+        return self._transaction(_claim)
+
+    def heartbeat(self, job, progress=None):
+        """Renew the job's lease (and optionally its progress). False if the lease was lost."""
+        def _heartbeat(conn):
+            if progress is None:
+                cursor = conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                    (time.time(), job["id"], job["owner"]),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ?, progress = ? "
+                    "WHERE id = ? AND owner = ? AND status = 'running'",
+                    (time.time(), str(progress), job["id"], job["owner"]),
+                )
+            return cursor.rowcount == 1
+
+        return self._transaction(_heartbeat)
+
+    def set_progress(self, job, progress):
+        return self.heartbeat(job, progress)
+
+    def finish(self, job, success, error=None):
+        """Record the outcome; ignored (returns False) if the job's lease was lost meanwhile."""
+        status = "succeeded" if success else "failed"
+        finished = self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ?, progress = ? "
+            "WHERE id = ? AND owner = ? AND status = 'running'",
+            (status, time.time(), error, status, job["id"], job["owner"]),
+        ).rowcount == 1)
+        if not finished:
+            logging.warning(f"[{job['param']}] Retrain job {job['id']} lost its lease; outcome not recorded.")
+        return finished
+
+    def recover(self, lease_seconds=None):
+        """Requeue running jobs whose lease expired (their worker stopped heartbeating)."""
+        lease_seconds = RETRAIN_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        count = self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'queued', progress = 'requeued after lease expired', owner = NULL "
+            "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?",
+            (time.time() - lease_seconds,),
+        ).rowcount)
+        if count:
+            logging.warning(f"Requeued {count} retrain job(s) with an expired lease.")
+        return count
+
+    def wait(self, job_ids, timeout=None):
+        """Block until the given jobs are finished (or `timeout`); returns {id: job}."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            jobs = {job_id: self.get(job_id) for job_id in job_ids}
+            if all(j is None or j["status"] in ("succeeded", "failed") for j in jobs.values()):
+                return jobs
+            if deadline is not None and time.time() > deadline:
+                return jobs
+            time.sleep(RETRAIN_POLL_SECONDS)
+
+    def _get(self, conn, job_id):
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def get(self, job_id):
+        return self._transaction(lambda conn: self._get(conn, job_id))
+
+    def jobs(self, param=None, limit=50):
+        def _jobs(conn):
+            sql = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+            args = ()
+            if param:
+                sql += " WHERE param = ?"
+                args = (param,)
+            rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", args + (int(limit),)).fetchall()
+            return [dict(zip(_COLUMNS, r)) for r in rows]
+
+        return self._transaction(_jobs)
+
+    def pending(self):
+        """Number of queued or running jobs."""
+        return self._transaction(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0])
+
+
+queue = RetrainQueue()
+
+
+# --- WORKERS ---
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _keep_alive(job, stop):
+    # Renews the lease while training runs (progress updates alone can be minutes apart)
+    while not stop.wait(RETRAIN_LEASE_SECONDS / 3):
+        try:
+            if not queue.heartbeat(job):
+                return
+        except sqlite3.Error as e:
+            logging.warning(f"[{job['param']}] Heartbeat for retrain job {job['id']} failed: {e}")
+
+
+def run_job(job, retrain=None):
+    """Run one claimed job to completion and record the outcome."""
+    if retrain is None:
+        from retraining_service import attempt_retrain as retrain
+    param = job["param"]
+    stop = threading.Event()
+    threading.Thread(target=_keep_alive, args=(job, stop), name=f"retrain-lease-{job['id']}", daemon=True).start()
+    try:
+        success = retrain(param, progress=lambda msg: queue.set_progress(job, msg))
+        queue.finish(job, bool(success), None if success else "model still unhealthy after retraining")
+        return bool(success)
+    except Exception as e:
+        logging.error(f"[{param}] Retrain job {job['id']} crashed: {e}")
+        queue.finish(job, False, str(e))
+        return False
+    finally:
+        stop.set()
+
+
+def run_pending(retrain=None, on_finished=None):
+    """Run queued jobs in this thread until none can be claimed; returns the jobs run."""
+    done = []
+    while True:
+        job = queue.claim()
+        if job is None:
+            return done
+        run_job(job, retrain)
+        if on_finished:
+            on_finished(job)
+        done.append(job)
+
+
+def _worker_loop(retrain, on_finished):
+    while True:
+        # Jobs of a crashed worker (any pod) become claimable once their lease expires
+        queue.recover()
+        if not run_pending(retrain, on_finished):
+            time.sleep(RETRAIN_POLL_SECONDS)
+
+
+def start_workers(count=RETRAIN_MAX_CONCURRENT, retrain=None, on_finished=None):
+    """Start `count` daemon workers (once per process); claim() enforces the global cap."""
+    with _workers_lock:
+        if _workers:
+            return _workers
+        for i in range(max(1, count)):
+            worker = threading.Thread(
+                target=_worker_loop, args=(retrain, on_finished), name=f"retrain-worker-{i}", daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+    return _workers
@@ -2,15 +2,23 @@
 # (Removed Docker Utils as we use Shared PVC + Kubectl now)
 #for github
 #last for git
+import os
 import subprocess
 import logging
 
 MAX_RETRIES = 3
+# Inference pods watch latest_{param}.pt and hot-swap new weights themselves;
+# when enabled, no rollout restart (cold start) is needed after a retrain.
+INFERENCE_HOT_RELOAD = os.getenv("INFERENCE_HOT_RELOAD", "false").lower() == "true"
 
 def restart_inference_pod(param):
     """
     Restart the specific inference deployment to pick up new weights from PVC.
     """
+    if INFERENCE_HOT_RELOAD:
+        logging.info(f"[{param}] Inference hot reload enabled; new weights will be picked up without a restart.")
+        return
+
     deployment_name = f"inference-{param.lower()}"
     namespace = "weather-mlops"
     cmd = ["kubectl", "rollout", "restart", f"deployment/{deployment_name}", "-n", namespace]
@@ -24,13 +32,15 @@ def restart_inference_pod(param):
         logging.error(f"[{param}] Restart failed: {e.stderr.decode().strip()}")
         print(f"[{param}] Error restarting pod: {e.stderr.decode().strip()}")
 
-def attempt_retrain(param="T2M"):
+def attempt_retrain(param="T2M", progress=None):
     """
     Orchestrates the retraining loop.
     1. Backup current model to 'previous_{param}.pt' (Once, before loop).
     2. Loop max 3 times.
     3. Restart K8s Pod on success.
+    Blocking; callers should go through retrain_queue, which reports `progress(msg)`.
     """
+    progress = progress or (lambda msg: None)
     logging.info(f"[{param}] Starting Conditional Retraining Loop...")
     print(f"\n[ATTENTION] Model for {param} is performing poorly. Retraining required.")
     
@@ -49,12 +59,14 @@ def attempt_retrain(param="T2M"):
 
     for attempt in range(1, MAX_RETRIES + 1):
         print(f"\n>>> Retraining Attempt {attempt}/{MAX_RETRIES} for {param} <<<")
+        progress(f"training (attempt {attempt}/{MAX_RETRIES})")
         
         logging.info(f"[{param}] Proceeding with REAL retraining...")
         from train import train_model
         train_model(param)
         
         # Re-evaluate
+        progress(f"evaluating (attempt {attempt}/{MAX_RETRIES})")
         from model_evaluator import evaluate_model_health
         is_healthy, mae = evaluate_model_health(param)
         if is_healthy:
@@ -75,7 +87,10 @@ def attempt_retrain(param="T2M"):
     
     # --- REVERT LOGIC START ---
     if os.path.exists(previous_filename):
-        shutil.copy2(previous_filename, latest_filename)
+        progress("reverting to previous weights")
+        # Copy then rename so hot-reloading pods never read a partial file
+        shutil.copy2(previous_filename, f"{latest_filename}.tmp")
+        os.replace(f"{latest_filename}.tmp", latest_filename)
         logging.info(f"[{param}] Reverted: Restored original weights from {previous_filename} to {latest_filename}.")
         print(f"[{param}] System reverted to original weights due to retraining failure.")
         # We should logically restart the pod here too, to revert the in-memory model? 
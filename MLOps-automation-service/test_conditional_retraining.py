@@ -68,5 +68,84 @@ class TestConditionalRetraining(unittest.TestCase):
         mock_train.assert_called_once()
         print("Successfully retrained and verified health.")
 
+    @patch('retrain_queue.start_workers')
+    @patch('health_monitor.evaluate_model_health')
+    def test_unhealthy_verdict_is_cached_and_enqueues_one_retrain(self, mock_eval, mock_start_workers):
+        import tempfile
+        import health_monitor
+        import retrain_queue
+        health_monitor._health.clear()
+        mock_eval.return_value = (False, 5.0)
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(retrain_queue, "queue", retrain_queue.RetrainQueue(os.path.join(tmp, "q.db"))):
+            # refresh() returns as soon as the job is queued; a second verdict reuses it
+            state = health_monitor.refresh("T2M")
+            health_monitor.refresh("T2M")
+            self.assertFalse(state["healthy"])
+            jobs = retrain_queue.queue.jobs("T2M")
+            self.assertEqual([j["status"] for j in jobs], ["queued"])
+            mock_start_workers.assert_called()
+
+        # A fresh verdict is served from the cache without re-evaluating
+        health_monitor._health["T2M"] = state
+        self.assertFalse(health_monitor.get_health("T2M")["healthy"])
+        self.assertEqual(mock_eval.call_count, 2)
+
+    def test_background_refresher_checks_every_param(self):
+        import threading
+        import health_monitor
+
+        seen, done = [], threading.Event()
+        def refresh_async(param):
+            seen.append(param)
+            if len(seen) == 3:
+                done.set()
+
+        self.assertGreater(health_monitor.HEALTH_REFRESH_SECONDS, 0)
+        with patch.object(health_monitor, "refresh_async", side_effect=refresh_async):
+            self.assertIsNotNone(health_monitor.start(["T2M", "RH2M", "WS2M"], interval=3600))
+            self.assertTrue(done.wait(5))
+        self.assertEqual(seen, ["T2M", "RH2M", "WS2M"])
+
+    def test_retrain_queue_limits_concurrency_and_records_progress(self):
+        import tempfile
+        import retrain_queue
+        with tempfile.TemporaryDirectory() as tmp:
+            q = retrain_queue.RetrainQueue(os.path.join(tmp, "q.db"))
+            t2m, _ = q.enqueue("T2M")
+            rh2m, _ = q.enqueue("RH2M")
+
+            # One running training blocks further claims at the default cap of 1
+            job = q.claim(max_running=1)
+            self.assertEqual(job["id"], t2m["id"])
+            self.assertIsNone(q.claim(max_running=1))
+            # A running param is not claimed twice even with spare capacity
+            _, created = q.enqueue("T2M")
+            self.assertFalse(created)
+            self.assertEqual(q.claim(max_running=2)["id"], rh2m["id"])
+
+            # Leased jobs survive recover(); once heartbeats stop for a lease they are requeued
+            self.assertEqual(q.recover(lease_seconds=60), 0)
+            self.assertTrue(q.heartbeat(job))
+            q._transaction(lambda conn: conn.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - 120"))
+            self.assertEqual(q.recover(lease_seconds=60), 2)
+            # The original worker lost its lease and can no longer record an outcome
+            self.assertFalse(q.finish(job, True))
+            self.assertFalse(q.heartbeat(job))
+
+            def fake_retrain(param, progress):
+                progress("training (attempt 1/3)")
+                return param == "T2M"
+
+            with patch.object(retrain_queue, "queue", q):
+                done = retrain_queue.run_pending(retrain=fake_retrain)
+            self.assertEqual(len(done), 2)
+            self.assertEqual(q.get(t2m["id"])["status"], "succeeded")
+            self.assertEqual(q.get(rh2m["id"])["status"], "failed")
+            self.assertEqual(q.pending(), 0)
+            waited = q.wait([t2m["id"], rh2m["id"]], timeout=1)
+            self.assertEqual(waited[rh2m["id"]]["status"], "failed")
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import sys
 import os
+from unittest.mock import patch
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -12,5 +13,112 @@ class TestMLOpsComponents(unittest.TestCase):
         except ImportError as e:
             self.fail(f"Failed to import modules: {e}")
 
+    def test_fetch_data_parses_and_cleans(self):
+        import data_pipeline
+        text = (
+            "-BEGIN HEADER-\nParameter(s):\nT2M  Temperature\n-END HEADER-\n"
+            "YEAR,DOY,T2M\n2024,59,20.0\n2024,60,-999\n2024,61,24.0\n"
+        )
+        with patch.object(data_pipeline.nasa_client, "get_text", return_value=text):
+            df = data_pipeline.fetch_data("T2M", days=3)
+        df = data_pipeline.validate_and_clean(df, "T2M")
+        self.assertEqual(str(df.index[1].date()), "2024-02-29")
+        self.assertEqual(list(df["Value"]), [20.0, 22.0, 24.0])
+
+    def test_sliding_windows_are_strided_views(self):
+        import numpy as np
+        from windowing import sliding_windows, window_count
+        series = np.arange(100, dtype=np.float32)
+        X, y = sliding_windows(series, 60, 10, stride=3)
+        expected = range(0, 100 - 70 + 1, 3)
+        self.assertEqual(len(X), window_count(100, 60, 10, stride=3))
+        self.assertEqual([float(x[0]) for x in X], [float(i) for i in expected])
+        self.assertEqual(y[-1].tolist(), series[expected[-1] + 60 : expected[-1] + 70].tolist())
+        # No copy: the windows alias the series buffer
+        self.assertEqual(X.untyped_storage().data_ptr(), series.__array_interface__["data"][0])
+        self.assertEqual(sliding_windows(series[:50], 60, 10)[0].shape, (0, 60))
+
+    def test_windowed_dataset_respects_series_boundaries(self):
+        import numpy as np
+        import torch
+        import data_pipeline
+        from windowing import sliding_windows
+        first = np.arange(80, dtype=np.float32)
+        second = np.arange(1000, 1075, dtype=np.float32)
+        dataset = data_pipeline.WindowedSeriesDataset([first, second])
+        self.assertEqual(len(dataset), 11 + 6)
+
+        # A batch spanning both series matches the per-series windows
+        x, y, t = dataset.__getitems__([10, 11, 16])
+        fx, fy = sliding_windows(first, 60, 10)
+        sx, sy = sliding_windows(second, 60, 10)
+        self.assertTrue(torch.equal(x, torch.stack([fx[10], sx[0], sx[5]])))
+        self.assertTrue(torch.equal(y, torch.stack([fy[10], sy[0], sy[5]])))
+        self.assertEqual(t.shape, (3, 60))
+
+        train, test = dataset.split(0.8)
+        self.assertEqual((len(train), len(test)), (8 + 4, 3 + 2))
+        batches = list(data_pipeline.batch_loader(train, 5, shuffle=True))
+        self.assertEqual(sum(len(b[0]) for b in batches), len(train))
+
+    def test_corpus_ingest_round_trip(self):
+        import tempfile
+        import numpy as np
+        import corpus_store
+        import data_pipeline
+        import ingest_corpus
+
+        down = {-5.0}
+
+        def fake_get_text(url):
+            lat = float(url.split("latitude=")[1].split("&")[0])
+            if lat in down:
+                raise ConnectionError("upstream down")
+            rows = "\n".join(f"2024,{doy},{lat + doy},{50.0}" for doy in range(1, 101))
+            return "-BEGIN HEADER-\n-END HEADER-\nYEAR,DOY,T2M,RH2M\n" + rows + "\n"
+
+        locations = [{"lat": 10.0, "lon": 70.0}, {"lat": -5.0, "lon": 70.0}, {"lat": 20.0, "lon": 80.0}]
+        with tempfile.TemporaryDirectory() as tmp:
+            store = corpus_store.CorpusStore(tmp)
+            with patch.object(ingest_corpus, "store", store), \
+                    patch.object(corpus_store, "store", store), \
+                    patch.object(data_pipeline.nasa_client, "get_text", side_effect=fake_get_text):
+                stored, failed = ingest_corpus.ingest(
+                    locations, ["T2M", "RH2M"], days=100, workers=2, rate=0, max_failed_fraction=0.5
+                )
+                self.assertEqual((stored, failed), (2, 1))
+
+                # Index by location and date range, values memory-mapped from the columns
+                first_day = int(np.datetime64("2024-01-01", "D").astype(np.int64))
+                found = store.read("T2M", first_day + 10, first_day + 19)
+                self.assertEqual([e["location"] for e, _, _ in found], ["10.0000,70.0000", "20.0000,80.0000"])
+                self.assertEqual(found[1][2].tolist(), [20.0 + doy for doy in range(11, 21)])
+                self.assertIsInstance(found[0][2], np.memmap)
+
+                dataset, means, stds = data_pipeline.prepare_corpus_dataset("T2M")
+                self.assertEqual(len(dataset), 2 * (100 - 70 + 1))
+                self.assertEqual(len(means), 2)
+
+                # A failed location keeps its previous series instead of dropping out
+                down.clear()
+                down.add(20.0)
+                stored, failed = ingest_corpus.ingest(
+                    locations, ["T2M"], days=100, workers=2, rate=0, max_failed_fraction=0.5
+                )
+                self.assertEqual((stored, failed), (2, 1))
+                found = store.read("T2M")
+                self.assertEqual(len(found), 3)
+                self.assertEqual(found[2][2][:2].tolist(), [21.0, 22.0])
+
+                # Too many failures (outage): the corpus is left as it was
+                generation = store.generation("T2M")
+                down.update({10.0, -5.0})
+                stored, failed = ingest_corpus.ingest(
+                    locations, ["T2M"], days=100, workers=2, rate=0, max_failed_fraction=0.5
+                )
+                self.assertEqual((stored, failed), (0, 3))
+                self.assertEqual(store.generation("T2M"), generation)
+                self.assertEqual(len(store.read("T2M")), 3)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,5 @@
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset
 from transformers import GPT2Model, GPT2Config
 import os
 import argparse
@@ -13,27 +12,34 @@ import mlflow.pytorch
 
 # Local Imports
 from model import ForecastingModel, D, T_IN, T_OUT
-from data_pipeline import run_pipeline
+from data_pipeline import run_dataset_pipeline, prepare_corpus_dataset, batch_loader
+import profiling
 
 # Parameters
 BATCH_SIZE = 64
 EPOCHS = 15 # Reduced for quicker demo, increase for prod
 LEARNING_RATE = 21e-5
+# Epochs (1-based, e.g. "1,10") to profile; PROFILE_SAMPLE_RATE samples others
+PROFILE_EPOCHS = {int(e) for e in os.getenv("PROFILE_EPOCHS", "").split(",") if e.strip()}
+# Train on the multi-location corpus (ingest_corpus.py) when it has the param
+TRAIN_FROM_CORPUS = os.getenv("TRAIN_FROM_CORPUS", "true").lower() == "true"
 
 def train_model(param="T2M"):
+    """Train, evaluate and save a model for `param`; returns the test MSE."""
+    _, test_mse, _ = _train_and_evaluate(param)
+    return test_mse
+
+def _train_and_evaluate(param):
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"--- Starting Training for {param} on {device} ---")
 
-    # 1. Data Pipeline
-    X, y, temporal_info, mean, std = run_pipeline(param)
+    # 1. Data Pipeline (windows are cut per batch from the normalized series)
+    corpus = prepare_corpus_dataset(param) if TRAIN_FROM_CORPUS else None
+    dataset, mean, std = corpus or run_dataset_pipeline(param)
     
-    # 2. Train/Test Split
-    split_idx = int(0.8 * len(X))
-    X_train, y_train, t_train = X[:split_idx], y[:split_idx], temporal_info[:split_idx]
-    X_test, y_test, t_test = X[split_idx:], y[split_idx:], temporal_info[split_idx:]
-    
-    train_dataset = TensorDataset(X_train, y_train, t_train)
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
+    # 2. Train/Test Split (chronological)
+    train_dataset, test_dataset = dataset.split(0.8)
+    train_loader = batch_loader(train_dataset, BATCH_SIZE, shuffle=True)
     
     # 3. Model Init
     print("[Model] Initializing ForecastingModel...")
@@ -46,25 +52,35 @@ def train_model(param="T2M"):
     for epoch in range(EPOCHS):
         model.train()
         total_loss = 0.0
-        for b_x, b_y, b_t in train_loader:
-            b_x, b_y, b_t = b_x.to(device), b_y.to(device), b_t.to(device)
-            
-            optimizer.zero_grad()
-            output = model(b_x.unsqueeze(-1), b_t)
-            loss = loss_function(output, b_y)
-            loss.backward()
-            optimizer.step()
-            total_loss += loss.item()
-            
+        profiled = profiling.should_profile(epoch + 1 in PROFILE_EPOCHS)
+        with profiling.profile(f"train-{param}-epoch{epoch + 1}", profiled):
+            for b_x, b_y, b_t in train_loader:
+                b_x, b_y, b_t = b_x.to(device), b_y.to(device), b_t.to(device)
+
+                optimizer.zero_grad()
+                with torch.profiler.record_function("ForecastingModel.forward"):
+                    output = model(b_x.unsqueeze(-1), b_t)
+                loss = loss_function(output, b_y)
+                with torch.profiler.record_function("backward"):
+                    loss.backward()
+                with torch.profiler.record_function("optimizer_step"):
+                    optimizer.step()
+                total_loss += loss.item()
+
         print(f"Epoch {epoch + 1}/{EPOCHS}, Loss: {total_loss / len(train_loader):.6f}")
         
     # 5. Evaluation
     model.eval()
+    squared_error, absolute_error, count = 0.0, 0.0, 0
     with torch.no_grad():
-        X_test, y_test, t_test = X_test.to(device), y_test.to(device), t_test.to(device)
-        predictions = model(X_test.unsqueeze(-1), t_test)
-        test_mse = loss_function(predictions, y_test).item()
-        test_mae = torch.mean(torch.abs(predictions - y_test)).item()
+        for X_test, y_test, t_test in batch_loader(test_dataset, BATCH_SIZE):
+            X_test, y_test, t_test = X_test.to(device), y_test.to(device), t_test.to(device)
+            predictions = model(X_test.unsqueeze(-1), t_test)
+            squared_error += torch.sum((predictions - y_test) ** 2).item()
+            absolute_error += torch.sum(torch.abs(predictions - y_test)).item()
+            count += y_test.numel()
+    test_mse = squared_error / max(count, 1)
+    test_mae = absolute_error / max(count, 1)
         
     print(f"[Evaluation] Test MSE: {test_mse:.6f}, Test MAE: {test_mae:.6f}")
     
@@ -80,17 +96,17 @@ def train_model(param="T2M"):
     torch.save(model.state_dict(), version_filename)
     print(f"[Saved] Versioned model: {version_filename}")
     
-    # Update latest symlink/copy
-    torch.save(model.state_dict(), latest_filename)
+    # Update latest copy atomically: inference pods hot-reload this file and
+    # must never see a half-written checkpoint
+    tmp_filename = f"{latest_filename}.tmp"
+    torch.save(model.state_dict(), tmp_filename)
+    os.replace(tmp_filename, latest_filename)
     print(f"[Saved] Updated latest model: {latest_filename}")
     
-    return test_mse
+    return model, test_mse, test_mae
 
 def train_and_log(param):
-    X_train, y_train, X_test, y_test, temporal_train, temporal_test, mean, std = run_pipeline(param)
-    model, test_mse, test_mae = train_model(
-        param, X_train, y_train, X_test, y_test, temporal_train, temporal_test
-    )
+    model, test_mse, test_mae = _train_and_evaluate(param)
 
     # MLflow logging
     mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5001"))
@@ -0,0 +1,206 @@
+from quart import Quart, request, jsonify, g
+from quart_cors import cors
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from forecast import (
+    forecast_from_records, forecast_inputs, update_stats, forecast_cache, batching_stats
+)
+import forecast
+from param_service import APP_VERSION
+import model_loader
+import inference_backend
+import nasa_client
+import profiling
+from forecast_store import store as precomputed_store
+from forecast_cache import location_key
+import warmup
+import metrics
+import cpu_quota
+
+# Async (ASGI) serving mode for the inference service.
+# Same /health, /version, /stats and /forecast contract as param_service.py.
+# Blocking work never runs on the event loop: NASA fetches go through
+# nasa_client (retries, backoff, circuit breaker, stale-series fallback) on a
+# fetch thread pool, and CPU-bound work (parsing, inference) runs on a
+# separate bounded pool so slow upstream calls cannot starve inference.
+#
+# Run with:  python async_service.py   (or: hypercorn async_service:app -b 0.0.0.0:5001)
+
+# --- CONFIGURATION ---
+# Threads for parsing + model inference (keeps CPU work bounded per pod)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+# Threads waiting on NASA POWER; connections come from nasa_client's pool
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", str(nasa_client.NASA_POOL_SIZE)))
+
+app = Quart(__name__)
+app = cors(app)
+
+_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+_fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+# Identical in-flight requests await the same task (async single-flight)
+_in_flight = {}
+
+
+# --- METRICS ---
+@app.before_request
+async def _start_request_timer():
+    g.started_at = time.perf_counter()
+    g.endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.IN_FLIGHT.inc(g.endpoint)
+
+
+@app.after_request
+async def _observe_request(response):
+    if "started_at" in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.started_at, g.endpoint, str(response.status_code))
+    return response
+
+
+@app.teardown_request
+async def _end_request(exc):
+    if "endpoint" in g:
+        metrics.IN_FLIGHT.dec(g.endpoint)
+
+
+@app.before_serving
+async def startup():
+    cpu_quota.configure_torch_threads()
+    warmup.start()
+    model_loader.start_model_watcher()
+
+
+@app.after_serving
+async def shutdown():
+    _executor.shutdown(wait=False)
+    _fetch_executor.shutdown(wait=False)
+
+
+async def _offload(fn, *args, executor=None):
+    return await asyncio.get_running_loop().run_in_executor(executor or _executor, fn, *args)
+
+
+async def fetch_nasa_records_multi(lat, lon, params, history_days):
+    """Async counterpart of forecast.fetch_nasa_records_multi (same client, breaker and fallback)."""
+    return await _offload(
+        forecast.fetch_nasa_records_multi, lat, lon, params, history_days, executor=_fetch_executor
+    )
+
+
+async def run_forecast(lat, lon, params):
+    # Hot locations are answered from the daily precomputed store
+    precomputed = await _offload(precomputed_store.lookup_many, lat, lon, params)
+    params = [p for p in params if p not in precomputed]
+    if not params:
+        return precomputed
+
+    stats, history_days = await _offload(forecast_inputs, lat, lon, params)
+    records = await fetch_nasa_records_multi(lat, lon, params, history_days)
+    stats = await _offload(update_stats, lat, lon, params, records, stats)
+    results = await asyncio.gather(
+        *[_offload(forecast_from_records, lat, lon, p, records[p], stats[p]) for p in params],
+        return_exceptions=True,
+    )
+    return dict(precomputed, **{
+        p: ({"error": str(r)} if isinstance(r, Exception) else r)
+        for p, r in zip(params, results)
+    })
+
+
+async def _single_flight(key, lat, lon, params):
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(run_forecast(lat, lon, params))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # shield: a disconnecting client must not cancel other waiters' work
+    return await asyncio.shield(task)
+
+
+@app.route("/health")
+async def health():
+    return jsonify({"status": "up", "service": "param-service"}), 200
+
+
+@app.route("/ready")
+async def ready():
+    """Readiness probe: 503 until the configured models are loaded and warmed up."""
+    status = warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/version")
+async def version():
+    """Returns the application version (and active model weights) for the Frontend to display."""
+    return jsonify({"version": APP_VERSION, "models": model_loader.model_versions()}), 200
+
+
+@app.route("/stats")
+async def stats():
+    """Internal counters for tuning (coalescing, result cache, batching, upstream)."""
+    return jsonify({
+        "coalescing": {"in_flight": len(_in_flight)},
+        "forecast_cache": forecast_cache.stats(),
+        "batching": batching_stats(),
+        "nasa_client": nasa_client.client.stats(),
+        "model_reload": model_loader.reload_stats(),
+        "quantization": model_loader.quantization_stats(),
+        "inference_backend": inference_backend.backend_stats(),
+        "precomputed": precomputed_store.stats(),
+        "profiling": profiling.stats(),
+    }), 200
+
+
+@app.route("/metrics")
+async def metrics_route():
+    """Prometheus scrape endpoint (same registry as param_service)."""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
+@app.route("/forecast", methods=["POST"])
+async def forecast_route():
+    data = await request.get_json()
+    lat = data.get("lat")
+    lon = data.get("lon")
+    prop = data.get("property", "T2M")
+    props = data.get("properties")
+
+    logging.info(f"Forecast request: lat={lat}, lon={lon}, prop={props or prop}")
+
+    if props is not None and not isinstance(props, list):
+        return jsonify({"error": "properties must be a list"}), 400
+    params = list(dict.fromkeys(props)) if props else [prop]
+    unknown = [p for p in params if p not in model_loader.PROPERTIES]
+    if unknown:
+        return jsonify({"error": f"Unknown properties {unknown}; expected {list(model_loader.PROPERTIES)}"}), 400
+
+    try:
+        cell = location_key(lat, lon)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid lat/lon: {e}"}), 400
+
+    try:
+        results = await _single_flight((cell, tuple(params)), lat, lon, params)
+    except Exception as e:
+        logging.error(f"Prediction failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    headers = {"X-Grid-Cell": cell, "X-Request-Lat": str(lat), "X-Request-Lon": str(lon)}
+    if props:
+        return jsonify(results), 200, headers
+    if isinstance(results[prop], dict):
+        logging.error(f"Prediction failed: {results[prop]['error']}")
+        return jsonify(results[prop]), 500
+    return jsonify(results[prop]), 200, headers
+
+
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = ["0.0.0.0:5001"]
+    asyncio.run(serve(app, config))
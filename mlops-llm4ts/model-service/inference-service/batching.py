@@ -0,0 +1,124 @@
+# batching.py - Dynamic micro-batching for ForecastingModel inference
+#
+# Concurrent requests put their [1, T_IN, 1] windows on a queue. A worker thread
+# collects them for up to `max_wait_ms` (or until `max_batch_size` is reached),
+# runs a single batched forward pass and hands each caller its own row back.
+
+import time
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+import torch
+
+# Number of recent queue waits kept for the percentile report
+_WAIT_SAMPLES = 1000
+# Queued by close(): the worker stops once the requests ahead of it are served
+_STOP = object()
+
+
+class _Request:
+    def __init__(self, window, temporal_info):
+        self.window = window
+        self.temporal_info = temporal_info
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Groups concurrent forward passes into one batch per `max_wait_ms` window."""
+
+    def __init__(self, model_fn, max_batch_size=8, max_wait_ms=5.0, name="batcher"):
+        self.model_fn = model_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = {}
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        self._requests = 0
+        self._batches = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, window, temporal_info):
+        """Queue one [1, T_IN, 1] window and block until its prediction row is ready."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        request = _Request(window, temporal_info)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self, timeout=5):
+        """Serve the requests already queued, then stop the worker thread."""
+        self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return []
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                # Run this batch first; the next _collect() sees the stop
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                x = torch.cat([r.window for r in batch])
+                t = torch.cat([r.temporal_info for r in batch])
+                with torch.no_grad():
+                    out = self.model_fn(x, t).cpu().numpy()
+                for request, row in zip(batch, out):
+                    request.result = row
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+
+            with self._lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._waits.extend(started - r.enqueued_at for r in batch)
+
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        with self._lock:
+            waits_ms = np.array(self._waits) * 1000.0
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "mean_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "queue_depth": self._queue.qsize(),
+                "queue_wait_ms_p50": float(np.percentile(waits_ms, 50)) if len(waits_ms) else 0.0,
+                "queue_wait_ms_p99": float(np.percentile(waits_ms, 99)) if len(waits_ms) else 0.0,
+                "queue_wait_ms_max": float(waits_ms.max()) if len(waits_ms) else 0.0,
+            }
@@ -0,0 +1,84 @@
+# bench_parser.py - Compare the old pandas CSV path with nasa_parser
+#
+# Usage: python bench_parser.py [rows] [repeats]
+# Uses a synthetic NASA POWER response (same layout as the real API).
+
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+import numpy as np
+
+import nasa_parser
+
+HEADER = """-BEGIN HEADER-
+NASA/POWER CERES/MERRA2 Native Resolution Daily Data
+Dates (month/day/year): 01/01/2020 through 12/31/2024
+Location: Latitude  13.18   Longitude 77.8
+Elevation from MERRA-2: Average for 0.5 x 0.625 degree lat/lon region = 878.55 meters
+The value for missing source data that cannot be computed or is outside of the sources availability range: -999
+Parameter(s):
+T2M     MERRA-2 Temperature at 2 Meters (C)
+-END HEADER-
+YEAR,DOY,T2M
+"""
+
+
+def make_response(rows):
+    rng = np.random.default_rng(0)
+    lines = []
+    for i in range(rows):
+        year, doy = 2020 + i // 365, i % 365 + 1
+        value = -999.0 if i >= rows - 3 else round(22 + 5 * rng.standard_normal(), 2)
+        lines.append(f"{year},{doy},{value}")
+    return HEADER + "\n".join(lines) + "\n"
+
+
+def pandas_path(text, param="T2M"):
+    """The parse previously done in forecast.fetch_nasa_data."""
+    import pandas as pd
+
+    df = pd.read_csv(StringIO(text), skiprows=9)
+    df.columns = [c.strip() for c in df.columns]
+    df["Date"] = pd.to_datetime(
+        df["YEAR"].astype(str) + df["DOY"].astype(str).str.zfill(3),
+        format="%Y%j"
+    )
+    df.set_index("Date", inplace=True)
+    return df[param].values.astype(np.float32)
+
+
+def numpy_path(text, param="T2M"):
+    return nasa_parser.parse_csv(text, [param])[1][param]
+
+
+def bench(fn, text, repeats):
+    fn(text)  # warm-up (imports, caches)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(text)
+    per_call_ms = (time.perf_counter() - started) / repeats * 1000
+
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call_ms, peak / 1024
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 365 + 5
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    text = make_response(rows)
+
+    started = time.perf_counter()
+    import pandas  # noqa: F401
+    print(f"pandas import: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    old, new = pandas_path(text), numpy_path(text)
+    assert np.allclose(old[:-3], new[:-3]) and np.isnan(new[-3:]).all()
+
+    for name, fn in [("pandas", pandas_path), ("nasa_parser", numpy_path)]:
+        ms, peak_kib = bench(fn, text, repeats)
+        print(f"{name:12s} {rows} rows: {ms:7.3f} ms/parse, peak alloc {peak_kib:8.1f} KiB")
@@ -0,0 +1,60 @@
+# coalescing.py - Single-flight request coalescing
+#
+# When many identical requests arrive together, only the first one ("leader")
+# runs the computation; the others wait for the leader and share its result.
+
+import threading
+
+
+class CoalescingTimeout(TimeoutError):
+    """Raised when a waiting caller gives up on the in-flight computation."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one computation per key; concurrent callers wait on it."""
+
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"executed": 0, "coalesced": 0, "timeouts": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executed"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise CoalescingTimeout(f"Timed out after {self.timeout}s waiting for in-flight request")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
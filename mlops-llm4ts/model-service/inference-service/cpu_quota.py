@@ -0,0 +1,75 @@
+# cpu_quota.py - Size worker processes and torch thread pools from the CPU limit
+#
+# torch defaults to one intra-op thread per *host* core, not per core the pod
+# may use. Under a 500m CPU limit that means dozens of threads fighting over
+# half a core, which throttles every forward pass. The container's real budget
+# comes from the cgroup CPU quota.
+
+import os
+import math
+import logging
+
+import torch
+
+# Explicit overrides (otherwise derived from the quota)
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+
+
+def _cgroup_quota():
+    """CPU limit from cgroup v2 (cpu.max) or v1 (cfs quota/period), or None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    """Fractional CPUs this container may use (quota, else the affinity mask)."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = _cgroup_quota()
+    return min(quota, cores) if quota else float(cores)
+
+
+def default_workers():
+    """One worker process per whole CPU (at least one)."""
+    return max(1, math.floor(available_cpus()))
+
+
+def threads_per_worker(workers=1):
+    if TORCH_THREADS > 0:
+        return TORCH_THREADS
+    return max(1, math.floor(available_cpus() / max(1, workers)))
+
+
+def configure_torch_threads(workers=1):
+    """Apply the per-process torch thread budget. Returns the intra-op thread count."""
+    threads = threads_per_worker(workers)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+    except RuntimeError:
+        # Only settable before the first inter-op parallel work in this process
+        pass
+    logging.info(
+        f"torch threads: intra-op {threads}, inter-op {torch.get_num_interop_threads()} "
+        f"({available_cpus():.2f} CPUs available, {workers} worker(s))"
+    )
+    return threads
@@ -1,47 +1,240 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import pandas as pd
 import numpy as np
-from io import StringIO
 from datetime import datetime, timedelta
 import torch
 
-from model_loader import load_model
+from model_loader import load_model, get_model_version
+from forecast_cache import ForecastCache, make_key, location_key
+from batching import MicroBatcher
+import series_store
+import nasa_client
+import nasa_parser
+import norm_stats
+import grid
+import metrics
+import profiling
 
 
 T_IN = 60       # Look-back window
 T_OUT = 10      # Forecast horizon
+HISTORY_DAYS = 5 * 365 + 4  # Normalization history requested from NASA
+# Window fetched when normalization stats are already known (T_IN + publishing lag)
+RECENT_DAYS = int(os.getenv("RECENT_FETCH_DAYS", str(T_IN + 15)))
 
+EPOCH = datetime(1970, 1, 1)
+
+# Micro-batching of concurrent forward passes (BATCH_MAX_SIZE=1 disables it)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# /forecast/batch: parallel upstream fetches and forward-pass chunk size
+BATCH_FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", "8"))
+BATCH_FORWARD_CHUNK = int(os.getenv("BATCH_FORWARD_CHUNK", "32"))
+
+# Finished forecasts, keyed by location, param, last observed day and model version
+forecast_cache = ForecastCache.from_env()
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _forward(model, window_tensor, temporal_info):
+    # Named range in torch.profiler traces (no-op unless profiling)
+    with torch.profiler.record_function("ForecastingModel.forward"):
+        return model(window_tensor, temporal_info)
+
+
+def _get_batcher(param):
+    with _batchers_lock:
+        if param not in _batchers:
+            _batchers[param] = MicroBatcher(
+                lambda x, t: _forward(load_model(param), x, t),
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                name=f"batcher-{param}",
+            )
+        return _batchers[param]
+
+
+def shutdown_batchers():
+    """Stop every micro-batcher's worker thread (on worker exit)."""
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+    for batcher in batchers:
+        batcher.close()
 
-def fetch_nasa_data(lat, lon, param="T2M"):
-    """Fetch last 5 years of weather data from NASA POWER API."""
-    now = datetime.now()
-    start = now - timedelta(days=(5 * 365 + 4))
 
-    url = (
+def batching_stats():
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {param: b.stats() for param, b in batchers.items()}
+
+
+def predict(model, param, window_tensor, temporal_info):
+    """Run one [1, T_IN, 1] window through the model, micro-batched if enabled."""
+    # A profiled request runs its forward inline: the batcher thread isn't traced
+    if BATCH_MAX_SIZE > 1 and not profiling.capturing():
+        return _get_batcher(param).submit(window_tensor, temporal_info)
+    with torch.no_grad():
+        return _forward(model, window_tensor, temporal_info).cpu().numpy().flatten()
+
+
+def _day_number(dt):
+    """Days since 1970-01-01 (the date encoding used by the series store)."""
+    return (dt - EPOCH).days
+
+
+def build_nasa_url(lat, lon, params, start_day, end_day):
+    """NASA POWER daily point URL for [start_day, end_day] and one or more parameters."""
+    start = EPOCH + timedelta(days=start_day)
+    end = EPOCH + timedelta(days=end_day)
+    # Every point of a grid cell gets the same series; ask for the cell center
+    lat, lon = grid.canonical(lat, lon)
+
+    return (
         "https://power.larc.nasa.gov/api/temporal/daily/point?"
-        f"parameters={param}&community=AG&longitude={lon}&latitude={lat}"
-        f"&start={start.strftime('%Y%m%d')}&end={now.strftime('%Y%m%d')}&format=CSV"
+        f"parameters={','.join(params)}&community=AG&longitude={lon}&latitude={lat}"
+        f"&start={start.strftime('%Y%m%d')}&end={end.strftime('%Y%m%d')}&format=CSV"
     )
 
-    response = requests.get(url)
-    response.raise_for_status()
 
-    df = pd.read_csv(StringIO(response.text), skiprows=9)
-    df.columns = [c.strip() for c in df.columns]
+def parse_nasa_csv(text, params):
+    """Parse a NASA POWER CSV response into {param: series store records}."""
+    days, values = nasa_parser.parse_csv(text, params)
+    return {param: series_store.make_records(days, values[param]) for param in params}
 
-    df["Date"] = pd.to_datetime(
-        df["YEAR"].astype(str) + df["DOY"].astype(str).str.zfill(3),
-        format="%Y%j"
-    )
-    df.set_index("Date", inplace=True)
 
-    return df[param].values.astype(np.float32)
+def download_nasa_series(lat, lon, params, start_day, end_day):
+    """
+    Download [start_day, end_day] for one or more parameters in a single NASA
+    POWER call. Returns {param: series store records}.
+    """
+    label = ",".join(sorted(params))
+    with metrics.stage("fetch", label):
+        text = nasa_client.get_text(build_nasa_url(lat, lon, params, start_day, end_day))
+    with metrics.stage("parse", label):
+        return parse_nasa_csv(text, params)
+
+
+class FetchPlan:
+    """What the series store already holds for a location and what is still missing."""
+
+    def __init__(self, lat, lon, params, history_days=HISTORY_DAYS):
+        self.lat, self.lon = lat, lon
+        self.end_day = _day_number(datetime.now())
+        self.start_day = self.end_day - history_days
+        self.records = {}
+        self.stale = []
+        self.fetch_from = self.end_day
+
+        for param in params:
+            stored = series_store.load_series(lat, lon, param)
+            covered = stored is not None and len(stored) > 0 and stored["date"][0] <= self.start_day
+            resume = series_store.resume_day(stored) if covered else None
+            self.records[param] = stored
+
+            if covered and resume is not None and (
+                resume > self.end_day or series_store.is_fresh(lat, lon, param)
+            ):
+                continue
+            self.stale.append(param)
+            self.fetch_from = min(self.fetch_from, resume if resume is not None else self.start_day)
+
+    def apply(self, fresh):
+        """Merge freshly downloaded {param: records} into the store."""
+        for param in self.stale:
+            merged = series_store.merge_series(self.records[param], fresh[param])
+            # Only keep the history we can serve from so files stay bounded
+            merged = merged[merged["date"] >= self.end_day - HISTORY_DAYS]
+            series_store.save_series(self.lat, self.lon, param, merged)
+            self.records[param] = merged
+
+    def has_stale_copy(self):
+        """True if every stale parameter still has some stored history to fall back on."""
+        return all(
+            self.records[p] is not None and len(self.records[p]) >= T_IN for p in self.stale
+        )
+
+    def windows(self):
+        return {
+            param: r[(r["date"] >= self.start_day) & (r["date"] <= self.end_day)]
+            for param, r in self.records.items()
+        }
+
+
+def fetch_nasa_records_multi(lat, lon, params, history_days=HISTORY_DAYS):
+    """
+    Return the last `history_days` (default 5 years) of daily (date, value)
+    records for each parameter.
+    History comes from the local series store; NASA POWER is asked once, for the
+    parameters that are stale and only for the days after the last published
+    value we already hold. If NASA is down (or the circuit breaker is open) the
+    stored series is served as-is when we have one.
+    """
+    plan = FetchPlan(lat, lon, params, history_days)
+    if plan.stale:
+        try:
+            fresh = download_nasa_series(lat, lon, plan.stale, plan.fetch_from, plan.end_day)
+        except requests.exceptions.RequestException as e:
+            if not plan.has_stale_copy():
+                raise
+            logging.warning(f"NASA POWER unavailable ({e}); serving stored series for {lat},{lon}")
+            nasa_client.client.count("stale_served")
+            return plan.windows()
+        plan.apply(fresh)
+    return plan.windows()
+
+
+def fetch_nasa_records(lat, lon, param="T2M", history_days=HISTORY_DAYS):
+    """Return the last 5 years of daily (date, value) records for a location."""
+    return fetch_nasa_records_multi(lat, lon, [param], history_days)[param]
+
+
+def fetch_nasa_data(lat, lon, param="T2M"):
+    """Return the last 5 years of daily values for a location."""
+    return fetch_nasa_records(lat, lon, param)["value"].astype(np.float32)
+
+
+def forecast_inputs(lat, lon, params):
+    """
+    Normalization stats already known for each param, and how much history the
+    fetch therefore needs: only the recent window if every param has stats.
+    """
+    stats = {p: norm_stats.get(lat, lon, p) for p in params}
+    history_days = RECENT_DAYS if all(stats.values()) else HISTORY_DAYS
+    return stats, history_days
+
 
+def update_stats(lat, lon, params, records, stats):
+    """Persist stats for params fetched with full history; refresh old ones in the background."""
+    for param in params:
+        if stats[param] is None:
+            stats[param] = norm_stats.put(lat, lon, param, nasa_parser.fill_gaps(records[param]["value"]))
+        elif norm_stats.is_stale(stats[param]):
+            norm_stats.refresh_async(
+                lat, lon, param,
+                lambda param=param: nasa_parser.fill_gaps(fetch_nasa_records(lat, lon, param)["value"]),
+            )
+    return stats
 
-def preprocess_series(series):
+
+def fetch_for_forecast(lat, lon, params):
+    """Fetch records for a forecast plus the normalization stats to use with them."""
+    stats, history_days = forecast_inputs(lat, lon, params)
+    records = fetch_nasa_records_multi(lat, lon, params, history_days)
+    return records, update_stats(lat, lon, params, records, stats)
+
+
+def preprocess_series(series, mean=None, std=None):
     """Normalize and return sliding window arrays."""
-    mean = series.mean()
-    std = series.std() if series.std() > 0 else 1.0
+    if mean is None:
+        mean = series.mean()
+        std = series.std() if series.std() > 0 else 1.0
 
     normalized = (series - mean) / std
 
@@ -57,6 +250,33 @@ def preprocess_series(series):
     return last_window_tensor, temporal_info, mean, std
 
 
+def preprocess_batch(series_list, stats_list=None):
+    """
+    Vectorized preprocess_series for many series at once.
+    Series may differ in length; they are NaN-padded so that mean/std are still
+    computed per series over its own values in one NumPy pass. Persisted stats
+    (entries of `stats_list` that are not None) take precedence.
+    """
+    longest = max(len(s) for s in series_list)
+    padded = np.full((len(series_list), longest), np.nan, dtype=np.float32)
+    for i, s in enumerate(series_list):
+        padded[i, longest - len(s):] = s
+
+    means = np.nanmean(padded, axis=1)
+    stds = np.nanstd(padded, axis=1)
+    stds[stds <= 0] = 1.0
+    for i, stats in enumerate(stats_list or []):
+        if stats is not None:
+            means[i], stds[i] = stats["mean"], stats["std"]
+
+    windows = (padded[:, -T_IN:] - means[:, None]) / stds[:, None]
+
+    window_tensor = torch.from_numpy(windows.astype(np.float32)).unsqueeze(-1)
+    temporal_info = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(len(series_list), -1)
+
+    return window_tensor, temporal_info, means, stds
+
+
 def postprocess(pred_norm, mean, std):
     """Convert normalized predictions back to real values."""
     pred = pred_norm * std + mean
@@ -72,27 +292,170 @@ def postprocess(pred_norm, mean, std):
     ]
 
 
+def forecast_from_records(lat, lon, param, records, stats=None):
+    """Cache lookup → preprocess → run model → postprocess for already-fetched records."""
+    # Unpublished trailing days are dropped, interior gaps interpolated
+    series = nasa_parser.fill_gaps(records["value"])
+
+    if len(series) < T_IN:
+        raise ValueError("Not enough data retrieved from NASA API")
+
+    # 1. Load Model
+    model = load_model(param)
+
+    # 2. Result cache: same inputs + same weights -> same forecast
+    # (resume_day is the day after the last published value)
+    cache_key = make_key(
+        lat, lon, param, series_store.resume_day(records),
+        get_model_version(param), datetime.now().date(), norm_stats.version(stats)
+    )
+    cached = forecast_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # 3. Preprocess (sliding windows + normalization)
+    with metrics.stage("preprocess", param):
+        if stats is not None:
+            window_tensor, temporal_info, mean, std = preprocess_series(series, stats["mean"], stats["std"])
+        else:
+            window_tensor, temporal_info, mean, std = preprocess_series(series)
+
+    # 4. Inference (includes the micro-batching wait)
+    with metrics.stage("forward", param):
+        pred_norm = predict(model, param, window_tensor, temporal_info)
+
+    # 5. Denormalize + cache + return response
+    result = postprocess(pred_norm, mean, std)
+    forecast_cache.put(cache_key, result)
+    return result
+
+
 def run_forecast(lat, lon, param="T2M"):
     """
     Main function called by app.py
-    Fetch → preprocess → run model → postprocess → return JSON
+    Fetch → (cache) → preprocess → run model → postprocess → return JSON
     """
-    # 1. Fetch NASA POWER data
-    series = fetch_nasa_data(lat, lon, param)
+    records, stats = fetch_for_forecast(lat, lon, [param])
+    return forecast_from_records(lat, lon, param, records[param], stats[param])
 
-    if len(series) < T_IN:
-        raise ValueError("Not enough data retrieved from NASA API")
 
-    # 2. Preprocess (sliding windows + normalization)
-    window_tensor, temporal_info, mean, std = preprocess_series(series)
+def run_forecast_multi(lat, lon, params):
+    """
+    Forecast several properties for one location from a single upstream fetch.
+    Each property's model runs concurrently; a failing property reports its own
+    error instead of failing the others.
+    """
+    records, stats = fetch_for_forecast(lat, lon, params)
+
+    with ThreadPoolExecutor(max_workers=len(params)) as pool:
+        futures = {
+            param: pool.submit(forecast_from_records, lat, lon, param, records[param], stats[param])
+            for param in params
+        }
+
+    results = {}
+    for param, future in futures.items():
+        try:
+            results[param] = future.result()
+        except Exception as e:
+            results[param] = {"error": str(e)}
+    return results
+
+
+def run_forecast_batch(locations, param="T2M"):
+    """
+    Forecast many locations in one call.
+    Fetches run concurrently, normalization is one NumPy step and the model sees
+    the whole batch (in BATCH_FORWARD_CHUNK-sized forwards). Locations in the same
+    grid cell are computed once. Returns one entry per location, in order, with
+    the request's lat/lon, its "cell" and either a "forecast" or an "error".
+    """
+    cells, unique = [], {}
+    for loc in locations:
+        lat, lon = loc.get("lat"), loc.get("lon")
+        if lat is None or lon is None:
+            cells.append(ValueError("lat and lon are required"))
+            continue
+        try:
+            cells.append(location_key(lat, lon))
+            unique.setdefault(cells[-1], loc)
+        except (TypeError, ValueError) as e:
+            cells.append(e)
+
+    by_cell = dict(zip(unique, _run_forecast_batch(list(unique.values()), param) if unique else []))
+    results = []
+    for loc, cell in zip(locations, cells):
+        entry = {"lat": loc.get("lat"), "lon": loc.get("lon")}
+        if isinstance(cell, Exception):
+            entry["error"] = str(cell)
+        else:
+            entry["cell"] = cell
+            entry.update({k: v for k, v in by_cell[cell].items() if k in ("forecast", "error")})
+        results.append(entry)
+    return results
+
+
+def _run_forecast_batch(locations, param):
+    results = [{"lat": loc.get("lat"), "lon": loc.get("lon")} for loc in locations]
+
+    def fetch(i):
+        lat, lon = results[i]["lat"], results[i]["lon"]
+        if lat is None or lon is None:
+            raise ValueError("lat and lon are required")
+        records, stats = fetch_for_forecast(lat, lon, [param])
+        return records[param], stats[param]
+
+    # 1. Fetch NASA POWER data concurrently
+    with ThreadPoolExecutor(max_workers=BATCH_FETCH_WORKERS) as pool:
+        futures = [pool.submit(fetch, i) for i in range(len(locations))]
 
-    # 3. Load Model
     model = load_model(param)
+    issue_date = datetime.now().date()
 
-    # 4. Inference
-    with torch.no_grad():
-        pred_norm = model(window_tensor, temporal_info).cpu().numpy().flatten()
+    # 2. Serve what we can from the result cache
+    pending = []  # (index, series, stats, cache_key)
+    for i, future in enumerate(futures):
+        try:
+            records, stats = future.result()
+        except Exception as e:
+            results[i]["error"] = str(e)
+            continue
+        series = nasa_parser.fill_gaps(records["value"])
+        if len(series) < T_IN:
+            results[i]["error"] = "Not enough data retrieved from NASA API"
+            continue
+
+        cache_key = make_key(
+            results[i]["lat"], results[i]["lon"], param, series_store.resume_day(records),
+            get_model_version(param), issue_date, norm_stats.version(stats)
+        )
+        cached = forecast_cache.get(cache_key)
+        if cached is not None:
+            results[i]["forecast"] = cached
+        else:
+            pending.append((i, series, stats, cache_key))
+
+    if not pending:
+        return results
+
+    # 3. Preprocess all remaining series together
+    with metrics.stage("preprocess", param):
+        window_tensor, temporal_info, means, stds = preprocess_batch(
+            [p[1] for p in pending], [p[2] for p in pending]
+        )
+
+    # 4. Batched inference
+    with metrics.stage("forward", param), torch.no_grad():
+        pred_norm = np.concatenate([
+            _forward(model, window_tensor[j:j + BATCH_FORWARD_CHUNK],
+                     temporal_info[j:j + BATCH_FORWARD_CHUNK]).cpu().numpy()
+            for j in range(0, len(pending), BATCH_FORWARD_CHUNK)
+        ])
 
-    # 5. Denormalize + return response
-    return postprocess(pred_norm, mean, std)
+    # 5. Denormalize + cache per location
+    for row, (i, _, _, cache_key) in enumerate(pending):
+        forecast = postprocess(pred_norm[row], means[row], stds[row])
+        forecast_cache.put(cache_key, forecast)
+        results[i]["forecast"] = forecast
 
+    return results
@@ -0,0 +1,164 @@
+# forecast_cache.py - Bounded forecast result cache (TTL + LRU + memory cap)
+#
+# A forecast only changes when NASA publishes a new day or the model weights
+# change, so both are part of the cache key: stale entries are simply never
+# looked up again and age out through LRU/TTL.
+#
+# An optional shared backend (SQLite file, e.g. on the model PVC) lets replicas
+# reuse each other's results. Any object with get(key) / put(key, value, ttl)
+# can be plugged in as a backend.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+import grid
+
+# Rounding applied to lat/lon before they become part of the key
+LATLON_DECIMALS = int(os.getenv("FORECAST_CACHE_LATLON_DECIMALS", "2"))
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", str(6 * 3600)))
+FORECAST_CACHE_MAX_BYTES = int(os.getenv("FORECAST_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# "" (in-process only) or "sqlite:<path>"
+FORECAST_CACHE_BACKEND = os.getenv("FORECAST_CACHE_BACKEND", "")
+
+
+def location_key(lat, lon):
+    """Grid cell id (or rounded "lat|lon") under which nearby requests share results."""
+    if grid.SNAP_TO_GRID:
+        return grid.cell_id(lat, lon)
+    return "|".join([
+        f"{round(float(lat), LATLON_DECIMALS):.{LATLON_DECIMALS}f}",
+        f"{round(float(lon), LATLON_DECIMALS):.{LATLON_DECIMALS}f}",
+    ])
+
+
+def make_key(lat, lon, param, last_observed_day, model_version, issue_date, stats_version=""):
+    """
+    Cache key for one forecast (issue_date keeps the returned dates correct,
+    stats_version drops results normalized with since-refreshed stats).
+    """
+    return "|".join([
+        location_key(lat, lon),
+        param,
+        str(last_observed_day),
+        str(model_version),
+        str(issue_date),
+        str(stats_version),
+    ])
+
+
+class SQLiteBackend:
+    """Shared cache entries in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM forecasts WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, ttl):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO forecasts (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+            conn.execute("DELETE FROM forecasts WHERE expires_at <= ?", (time.time(),))
+
+
+class ForecastCache:
+    """In-process LRU with TTL and an approximate byte cap, plus optional backend."""
+
+    def __init__(self, max_bytes=FORECAST_CACHE_MAX_BYTES, ttl=FORECAST_CACHE_TTL, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._stats = {"hits": 0, "backend_hits": 0, "misses": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        backend = None
+        if FORECAST_CACHE_BACKEND.startswith("sqlite:"):
+            try:
+                backend = SQLiteBackend(FORECAST_CACHE_BACKEND[len("sqlite:"):])
+            except sqlite3.Error as e:
+                logging.warning(f"Forecast cache backend disabled: {e}")
+        return cls(backend=backend)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[2]
+                self._remove(key)
+
+        value = None
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Forecast cache backend read failed: {e}")
+
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["backend_hits"] += 1
+        self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        self._store(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.put(key, value, self.ttl)
+            except sqlite3.Error as e:
+                logging.warning(f"Forecast cache backend write failed: {e}")
+
+    def _store(self, key, value):
+        size = len(key) + len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + self.ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
@@ -0,0 +1,106 @@
+# forecast_store.py - Precomputed daily forecasts for hot locations
+#
+# NASA POWER publishes new daily values once a day, so forecasts for the most
+# requested locations are computed once by precompute_forecasts.py and stored
+# here (a SQLite file on the model PVC, indexed by param + location key).
+# The service answers from the store first and only runs the model on a miss.
+# An entry is only served for the day it was issued and for the model
+# version that produced it.
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from forecast_cache import location_key
+import model_loader
+
+PRECOMPUTED_DB = os.getenv("PRECOMPUTED_DB", os.path.join("models", "precomputed_forecasts.db"))
+
+
+class ForecastStore:
+    def __init__(self, path=PRECOMPUTED_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0}
+        self._ready = False
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _ensure_schema(self):
+        if self._ready:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS precomputed ("
+                "param TEXT NOT NULL, location TEXT NOT NULL, issue_date TEXT NOT NULL, "
+                "model_version TEXT NOT NULL, forecast TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (param, location))"
+            )
+        self._ready = True
+
+    def write(self, param, items, model_version, issue_date):
+        """Store [(lat, lon, forecast), ...] and drop entries from earlier days."""
+        self._ensure_schema()
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO precomputed VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (param, location_key(lat, lon), str(issue_date), str(model_version), json.dumps(forecast), now)
+                    for lat, lon, forecast in items
+                ],
+            )
+            conn.execute(
+                "DELETE FROM precomputed WHERE param = ? AND issue_date < ?", (param, str(issue_date))
+            )
+
+    def get(self, lat, lon, param, model_version, issue_date):
+        if not os.path.exists(self.path):
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT forecast FROM precomputed "
+                "WHERE param = ? AND location = ? AND issue_date = ? AND model_version = ?",
+                (param, location_key(lat, lon), str(issue_date), str(model_version)),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, lat, lon, param):
+        """Today's precomputed forecast for the serving model version, or None."""
+        version = model_loader.get_model_version(param)
+        forecast = None
+        if version is not None and lat is not None and lon is not None:
+            try:
+                forecast = self.get(lat, lon, param, version, datetime.now().date())
+            except (sqlite3.Error, ValueError, TypeError) as e:
+                logging.warning(f"Precomputed forecast lookup failed: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+        with self._lock:
+            self._stats["hits" if forecast is not None else "misses"] += 1
+        return forecast
+
+    def lookup_many(self, lat, lon, params):
+        """{param: forecast} for the params that have a precomputed forecast."""
+        found = {}
+        for param in params:
+            forecast = self.lookup(lat, lon, param)
+            if forecast is not None:
+                found[param] = forecast
+        return found
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+store = ForecastStore()
@@ -0,0 +1,44 @@
+# grid.py - Snap coordinates to the NASA POWER (MERRA-2) native grid
+#
+# T2M, RH2M and WS2M come from MERRA-2, whose cells are 0.5 deg latitude x
+# 0.625 deg longitude: every point inside a cell gets the identical daily
+# series. Using the cell as the canonical location key lets nearby users share
+# NASA fetches, stored series, normalization stats and forecast results.
+# Set SNAP_TO_GRID=false to key on the (rounded) raw coordinates instead.
+
+import os
+import math
+
+SNAP_TO_GRID = os.getenv("SNAP_TO_GRID", "true").lower() == "true"
+
+LAT_STEP = 0.5
+LON_STEP = 0.625
+LON_CELLS = int(round(360 / LON_STEP))
+
+
+def cell_index(lat, lon):
+    """(row, col) of the cell whose center is nearest to (lat, lon)."""
+    lat, lon = float(lat), float(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"Coordinates out of range: lat={lat}, lon={lon}")
+    # floor(x + 0.5) rather than round(): no banker's rounding on cell edges
+    row = int(math.floor((lat + 90) / LAT_STEP + 0.5))
+    col = int(math.floor((lon + 180) / LON_STEP + 0.5)) % LON_CELLS
+    return row, col
+
+
+def cell_id(lat, lon):
+    row, col = cell_index(lat, lon)
+    return f"m2_{row}_{col}"
+
+
+def cell_center(lat, lon):
+    row, col = cell_index(lat, lon)
+    return row * LAT_STEP - 90, col * LON_STEP - 180
+
+
+def canonical(lat, lon):
+    """Coordinates used for fetching and storage: the cell center when snapping."""
+    if SNAP_TO_GRID:
+        return cell_center(lat, lon)
+    return float(lat), float(lon)
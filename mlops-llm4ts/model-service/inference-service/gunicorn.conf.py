@@ -0,0 +1,106 @@
+# gunicorn.conf.py - Pre-forking multi-model server for param_service
+#
+# Run with:  gunicorn -c gunicorn.conf.py param_service:app
+#
+# The master imports the app and loads + warms every model in
+# WARMUP_PROPERTIES (e.g. "T2M,RH2M,WS2M" to serve all properties from one
+# deployment) *before* forking. Workers then share the weights: they are
+# memory-mapped from the checkpoint (shared page cache) or, for quantized /
+# exported engines, inherited copy-on-write. Requests are routed to the right
+# model by their `property`, as before.
+#
+# Workers default to one per whole CPU of the cgroup quota and each worker's
+# torch thread pool is sized to its share, so the pod never runs more compute
+# threads than it has CPU.
+#
+# New weights are loaded once, in the master: its watcher thread notices a
+# changed latest_{param}.pt and sends the master SIGHUP; on_reload swaps the
+# models in and gunicorn forks fresh workers from it while the old ones finish
+# their requests. Workers never reload on their own, so every worker keeps
+# sharing one copy of each model. `kill -HUP <master pid>` forces a reload.
+
+import gc
+import os
+import signal
+import logging
+
+import cpu_quota
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "0")) or cpu_quota.default_workers()
+# Request threads per worker: forwards are CPU bound, but requests spend most
+# of their time waiting on NASA, and coalescing/micro-batching need concurrency
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+def on_starting(server):
+    import torch
+    import warmup
+
+    # No thread pools in the master: OpenMP pools don't survive fork()
+    torch.set_num_threads(1)
+    try:
+        warmup.mark_ready(warmup.warm_up())
+    except Exception as e:
+        # Workers retry on their own (and report not-ready until they succeed)
+        logging.error(f"Model preload in the master failed: {e}")
+    # Keep the collector from touching (and so copying) the preloaded objects' pages
+    gc.freeze()
+
+
+def when_ready(server):
+    import model_loader
+
+    # Queued like a received SIGHUP, without raising a signal in the master
+    model_loader.start_model_watcher(on_change=lambda changed: server.signal(signal.SIGHUP, None))
+
+
+def on_reload(server):
+    # Runs in the master before the replacement workers are forked
+    import model_loader
+    import warmup
+
+    reloaded = model_loader.reload_changed()
+    if reloaded:
+        try:
+            warmup.warm_up(reloaded)
+        except Exception as e:
+            logging.error(f"Warm-up of reloaded models {reloaded} failed: {e}")
+        server.log.info(f"Reloaded models {reloaded}; re-forking workers")
+    # Release the replaced models, then freeze the new ones for the next forks
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import warmup
+
+    cpu_quota.configure_torch_threads(server.cfg.workers)
+    if not warmup.is_ready():
+        warmup.start()
+
+
+def worker_exit(server, worker):
+    # Stop this worker's own threads (queued forwards are served first)
+    import sys
+    import forecast
+    import model_loader
+
+    forecast.shutdown_batchers()
+    model_loader.stop_model_watcher()
+    if "onnxruntime" not in sys.modules:
+        return
+    # torch.onnx imports onnxruntime in the master (on the first GPT-2 forward),
+    # and onnxruntime starts a native thread at import. The worker inherits
+    # that std::thread object but not the thread, so its static destructor
+    # aborts with std::system_error: skip native teardown once ours is done.
+    exc = sys.exc_info()[1]
+    code = exc.code if isinstance(exc, SystemExit) and isinstance(exc.code, int) else 0 if exc is None else 1
+    logging.shutdown()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
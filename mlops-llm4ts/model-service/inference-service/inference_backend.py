@@ -0,0 +1,197 @@
+# inference_backend.py - Exported inference engines for ForecastingModel
+#
+# Eager PyTorch + HuggingFace GPT2Model spends much of a small [B, 60, 1]
+# forward in Python dispatch. This module exports the loaded model to
+# TorchScript (traced + frozen) or ONNX (run by onnxruntime, if installed),
+# caches the artifact next to latest_{param}.pt keyed by the weights version,
+# checks numerical parity against eager and falls back to eager on any
+# mismatch or export error.
+#
+# INFERENCE_BACKEND: eager (default) | torchscript | onnx | auto
+# "auto" builds, checks and benchmarks one backend at a time (freeing the
+# losers before building the next, so at most one exported engine sits next
+# to the eager model) and leaves eager only for a backend at least
+# BACKEND_MIN_SPEEDUP times faster. Every backend returns a callable with the
+# model's (x, temporal_info) -> tensor signature.
+
+import os
+import gc
+import glob
+import time
+import logging
+import threading
+
+import numpy as np
+import torch
+
+from model import T_IN
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager").lower()
+BACKEND_PARITY_ATOL = float(os.getenv("BACKEND_PARITY_ATOL", "1e-4"))
+BACKEND_PARITY_RTOL = float(os.getenv("BACKEND_PARITY_RTOL", "1e-3"))
+# Batch sizes used for parity checks and the "auto" benchmark: the ones the
+# service actually runs (single requests, micro-batches, /forecast/batch chunks).
+# Read from the same variables as forecast.py, which imports this module.
+BACKEND_CHECK_BATCH_SIZES = tuple(sorted({
+    1, int(os.getenv("BATCH_MAX_SIZE", "8")), int(os.getenv("BATCH_FORWARD_CHUNK", "32")),
+}))
+BACKEND_BENCH_ITERATIONS = int(os.getenv("BACKEND_BENCH_ITERATIONS", "20"))
+# "auto" keeps eager unless a backend beats it by at least this factor
+BACKEND_MIN_SPEEDUP = float(os.getenv("BACKEND_MIN_SPEEDUP", "1.2"))
+
+_lock = threading.Lock()
+_reports = {}
+
+
+def backend_stats():
+    with _lock:
+        return {"mode": INFERENCE_BACKEND, "models": dict(_reports)}
+
+
+def _example_inputs(batch_size, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.randn(batch_size, T_IN, 1, generator=generator)
+    t = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(batch_size, -1).contiguous()
+    return x, t
+
+
+def _artifact_path(model_path, version, extension):
+    base, _ = os.path.splitext(model_path)
+    return f"{base}.{version}.{extension}"
+
+
+def _save_atomic(model_path, path, extension, write):
+    """Write an artifact via a temp file and drop artifacts of older weights. Best effort."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        base, _ = os.path.splitext(model_path)
+        for old in glob.glob(f"{glob.escape(base)}.*.{extension}"):
+            if old != path:
+                os.remove(old)
+    except OSError as e:
+        logging.warning(f"Could not cache inference artifact {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# --- BACKENDS ---
+
+def build_torchscript(model, model_path, version):
+    path = _artifact_path(model_path, version, "ts")
+    if os.path.exists(path):
+        return torch.jit.load(path, map_location="cpu")
+    with torch.no_grad():
+        traced = torch.jit.trace(model, _example_inputs(1))
+    frozen = torch.jit.freeze(traced.eval())
+    _save_atomic(model_path, path, "ts", lambda p: torch.jit.save(frozen, p))
+    return frozen
+
+
+class OnnxModel:
+    """onnxruntime session behind the model's (x, temporal_info) -> tensor interface."""
+
+    def __init__(self, path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, x, temporal_info):
+        out = self.session.run(None, {
+            "x": x.detach().numpy().astype(np.float32, copy=False),
+            "temporal_info": temporal_info.detach().numpy().astype(np.float32, copy=False),
+        })[0]
+        return torch.from_numpy(out)
+
+
+def build_onnx(model, model_path, version):
+    import onnxruntime  # noqa: F401  (fail early when the runtime isn't installed)
+
+    path = _artifact_path(model_path, version, "onnx")
+    if not os.path.exists(path):
+        def export(p):
+            with torch.no_grad():
+                torch.onnx.export(
+                    model, _example_inputs(1), p,
+                    input_names=["x", "temporal_info"], output_names=["forecast"],
+                    dynamic_axes={"x": {0: "batch"}, "temporal_info": {0: "batch"}, "forecast": {0: "batch"}},
+                    opset_version=17,
+                )
+        _save_atomic(model_path, path, "onnx", export)
+        if not os.path.exists(path):
+            raise RuntimeError(f"ONNX export to {path} failed")
+    return OnnxModel(path)
+
+
+BUILDERS = {"torchscript": build_torchscript, "onnx": build_onnx}
+
+
+# --- SELECTION ---
+
+def check_parity(model, candidate):
+    """Max abs difference vs eager; raises if outside tolerance."""
+    worst = 0.0
+    with torch.no_grad():
+        for batch_size in BACKEND_CHECK_BATCH_SIZES:
+            x, t = _example_inputs(batch_size, seed=batch_size)
+            expected, actual = model(x, t), candidate(x, t)
+            if actual.shape != expected.shape:
+                raise ValueError(f"shape {tuple(actual.shape)} != {tuple(expected.shape)}")
+            torch.testing.assert_close(actual, expected, atol=BACKEND_PARITY_ATOL, rtol=BACKEND_PARITY_RTOL)
+            worst = max(worst, float((actual - expected).abs().max()))
+    return worst
+
+
+def _benchmark_ms(engine):
+    total = 0.0
+    with torch.no_grad():
+        for batch_size in BACKEND_CHECK_BATCH_SIZES:
+            x, t = _example_inputs(batch_size)
+            engine(x, t)
+            started = time.perf_counter()
+            for _ in range(BACKEND_BENCH_ITERATIONS):
+                engine(x, t)
+            total += (time.perf_counter() - started) / BACKEND_BENCH_ITERATIONS * 1000
+    return total
+
+
+def select(param, model, model_path, version, mode=None):
+    """
+    Returns (engine, backend_name). `model` is the eager module and the fallback;
+    `version` identifies the weights (and quantization) for artifact caching.
+    """
+    mode = mode or INFERENCE_BACKEND
+    candidates = list(BUILDERS) if mode == "auto" else [mode] if mode in BUILDERS else []
+    report = {"version": version, "checked_batch_sizes": list(BACKEND_CHECK_BATCH_SIZES), "candidates": {}}
+    chosen, chosen_engine = "eager", model
+    if mode == "auto" and candidates:
+        eager_ms = best_ms = _benchmark_ms(model)
+        report["candidates"]["eager"] = {"bench_ms": round(eager_ms, 1)}
+
+    for name in candidates:
+        engine = None
+        try:
+            engine = BUILDERS[name](model, model_path, version)
+            entry = report["candidates"][name] = {"max_abs_diff": check_parity(model, engine)}
+            if mode == "auto":
+                ms = _benchmark_ms(engine)
+                entry["bench_ms"] = round(ms, 1)
+                if ms < best_ms and ms * BACKEND_MIN_SPEEDUP <= eager_ms:
+                    chosen, chosen_engine, best_ms = name, engine, ms
+            else:
+                chosen, chosen_engine = name, engine
+        except Exception as e:
+            logging.warning(f"[{param}] {name} backend unavailable, keeping eager fallback: {e}")
+            report["candidates"][name] = {"error": str(e)[:200]}
+        # Free a losing (or replaced) engine before building the next one
+        del engine
+        gc.collect()
+
+    report["backend"] = chosen
+    with _lock:
+        _reports[param] = report
+    logging.info(f"[{param}] Inference backend: {chosen}")
+    return chosen_engine, chosen
@@ -0,0 +1,172 @@
+# metrics.py - Prometheus text-format metrics for the inference service
+#
+# Minimal in-process registry (no client library): histograms, counters and
+# gauges with labels, rendered by /metrics. Recording a sample is a
+# perf_counter() pair plus a bisect and a few additions under a lock, cheap
+# enough to leave on for every request.
+#
+# Values that other modules already count (cache hits, upstream errors,
+# reloads, queue depth, ...) are not duplicated here: collectors registered
+# with `register_collector` read them from those modules' stats() at scrape time.
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Seconds; spans sub-ms preprocessing up to slow NASA fetches
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}_total{_labels(self.labelnames, k)} {_number(v)}" for k, v in sorted(values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        with self._lock:
+            values = {k: (list(v[0]), v[1], v[2]) for k, v in self._values.items()}
+        lines = self.header()
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+# --- REGISTRY ---
+
+_metrics = []
+_collectors = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn):
+    """`fn()` returns [(name, kind, documentation, [(labels dict, value), ...]), ...] at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            suffix = "_total" if kind == "counter" else ""
+            for labels, value in samples:
+                lines.append(f"{name}{suffix}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = _register(Histogram(
+    "forecast_stage_seconds",
+    "Time spent per forecast pipeline stage (fetch, parse, preprocess, model_load, forward, serialize).",
+    ["stage", "param"],
+))
+REQUEST_SECONDS = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["endpoint", "status"],
+))
+IN_FLIGHT = _register(Gauge("http_requests_in_flight", "Requests currently being served.", ["endpoint"]))
+
+
+def stage(name, param=""):
+    """Context manager timing one pipeline stage."""
+    return STAGE_SECONDS.time(name, param)
@@ -1,26 +1,327 @@
 import torch
-from model import ForecastingModel
+import torch.nn as nn
+from model import ForecastingModel, T_IN, T_OUT
 import os
+import time
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+
+import quantization
+import inference_backend
+import metrics
 
 MODELS_DIR = "models"
+# Seconds between checks of latest_{param}.pt for new weights (0 disables hot reload)
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+# "int8" serves a dynamically quantized model when it passes the backtest gate
+MODEL_QUANTIZE = os.getenv("MODEL_QUANTIZE", "").lower()
+
 _models = {}
+_versions = {}
+_lock = threading.Lock()
+_reloading = set()
+_failed_versions = {}
+_reload_stats = {"reloads": 0, "reload_failures": 0}
+_load_stats = {}
+_quantized = set()
+_quantization_reports = {}
 
-def load_model(param="T2M"):
-    global _models
-    
+
+# Properties with trained weights; requests for anything else are rejected
+PROPERTIES = ("T2M", "RH2M", "WS2M")
+
+
+def _model_path(param):
     # Map param to filename
-    # Assuming params are T2M, RH2M, WS2M
-    filename = f"latest_{param}.pt"
-    model_path = os.path.join(MODELS_DIR, filename)
+    return os.path.join(MODELS_DIR, f"latest_{param}.pt")
 
-    if param not in _models:
-        print(f"Loading model for {param} from {model_path}...")
+
+def _file_version(model_path):
+    """Identify a weights file by mtime and size (changes whenever it is rewritten)."""
+    stat = os.stat(model_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def get_model_version(param="T2M"):
+    """Version of the weights currently loaded for `param` (None if not loaded)."""
+    version = _versions.get(param)
+    if version is not None and param in _quantized:
+        # Quantized forecasts differ slightly, keep them apart in caches
+        version += "+int8"
+    return version
+
+
+def model_versions():
+    return {param: get_model_version(param) for param in list(_versions)}
+
+
+def quantization_stats():
+    return {"mode": MODEL_QUANTIZE or "off", "models": dict(_quantization_reports)}
+
+
+def reload_stats():
+    with _lock:
+        return dict(_reload_stats, reloading=sorted(_reloading), last_load=dict(_load_stats))
+
+
+# nn.Module.register_parameter is patched while any thread builds a model;
+# only threads inside _empty_weights() get meta parameters
+_meta_lock = threading.Lock()
+_meta_users = 0
+_meta_local = threading.local()
+_register_parameter = nn.Module.register_parameter
+
+
+def _register_on_meta(module, name, param):
+    if param is not None and getattr(_meta_local, "active", False):
+        param = nn.Parameter(param.to("meta"), requires_grad=param.requires_grad)
+    _register_parameter(module, name, param)
+
+
+@contextmanager
+def _empty_weights():
+    """
+    Create parameters on the meta device (no storage, no random init) while
+    buffers stay real: GPT2's causal-mask buffers are not in the checkpoint.
+    (torch.device("meta") would put those buffers on meta too.)
+    """
+    global _meta_users
+    with _meta_lock:
+        if _meta_users == 0:
+            nn.Module.register_parameter = _register_on_meta
+        _meta_users += 1
+    _meta_local.active = True
+    try:
+        yield
+    finally:
+        _meta_local.active = False
+        with _meta_lock:
+            _meta_users -= 1
+            if _meta_users == 0:
+                nn.Module.register_parameter = _register_parameter
+
+
+def _load_weights(model_path):
+    """Memory-map the checkpoint: tensors are backed by the file's pages, not copies."""
+    try:
+        return torch.load(model_path, map_location="cpu", mmap=True, weights_only=True)
+    except RuntimeError:
+        # Legacy (non-zipfile) checkpoints can't be mapped
+        logging.warning(f"{model_path} cannot be memory-mapped; loading a full copy")
+        return torch.load(model_path, map_location="cpu")
+
+
+def _rss_mb():
+    """Current resident set size (ru_maxrss would be the process-lifetime peak)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _build_model(model_path):
+    """Construct the model and load weights. Returns (model, version)."""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model weights not found: {model_path}")
+    version = _file_version(model_path)
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    with _empty_weights():
         model = ForecastingModel()
-        if os.path.exists(model_path):
-            model.load_state_dict(torch.load(model_path, map_location="cpu"))
-        else:
-            raise FileNotFoundError(f"Model weights not found: {model_path}")
-        model.eval()
-        _models[param] = model
-    
+    built = time.perf_counter()
+    # assign=True swaps the mapped tensors in instead of copying into the
+    # (meta) parameters; strict loading guarantees none are left on meta
+    model.load_state_dict(_load_weights(model_path), assign=True)
+    model.eval()
+    loaded = time.perf_counter()
+
+    stats = {
+        "construct_ms": round((built - started) * 1000, 1),
+        "load_ms": round((loaded - built) * 1000, 1),
+        # Mapped checkpoint pages count once they are touched
+        "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+    }
+    _load_stats.update(stats, path=model_path)
+    logging.info(
+        f"Loaded {model_path}: construct {stats['construct_ms']}ms, "
+        f"load {stats['load_ms']}ms, RSS +{stats['rss_delta_mb']}MiB"
+    )
+    return model, version
+
+
+def _maybe_quantize(param, model, version):
+    """Returns (model to serve, quantized?) according to MODEL_QUANTIZE and the accuracy gate."""
+    if MODEL_QUANTIZE != "int8":
+        return model, False
+    try:
+        quantized, quantized_version = _build_model(_model_path(param))
+        if quantized_version != version:
+            raise RuntimeError("weights changed while quantizing")
+        quantization.quantize_int8(quantized)
+        accepted, report = quantization.gate(param, model, quantized)
+    except Exception as e:
+        accepted, report = False, {"reason": str(e)}
+    report.update(version=version, active=accepted)
+    _quantization_reports[param] = report
+    if accepted:
+        logging.info(f"[{param}] Serving int8 quantized model: {report}")
+        return quantized, True
+    logging.warning(f"[{param}] Int8 quantization refused, serving fp32: {report}")
+    return model, False
+
+
+def _prepare(param, model, version):
+    """Quantize (if enabled) and pick the inference backend. Returns (engine, quantized?)."""
+    model, quantized = _maybe_quantize(param, model, version)
+    artifact_version = f"{version}+int8" if quantized else version
+    engine, _ = inference_backend.select(param, model, _model_path(param), artifact_version)
+    return engine, quantized
+
+
+def _validate(model):
+    """Synthetic forward pass: right shape and finite output, or raise."""
+    x = torch.zeros(1, T_IN, 1)
+    t = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0)
+    with torch.no_grad():
+        out = model(x, t)
+    if tuple(out.shape) != (1, T_OUT) or not torch.isfinite(out).all():
+        raise ValueError(f"Model produced invalid output of shape {tuple(out.shape)}")
+
+
+def load_model(param="T2M"):
+    if param not in _models:
+        with _lock:
+            if param not in _models:
+                model_path = _model_path(param)
+                print(f"Loading model for {param} from {model_path}...")
+                started = time.perf_counter()
+                model, version = _build_model(model_path)
+                model, quantized = _prepare(param, model, version)
+                # Only successful loads are observed; failures would skew the latency
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "model_load", param)
+                _models[param] = model
+                _versions[param] = version
+                if quantized:
+                    _quantized.add(param)
+
     return _models[param]
+
+
+def _reload(param, version):
+    try:
+        started = time.perf_counter()
+        model, loaded_version = _build_model(_model_path(param))
+        model, quantized = _prepare(param, model, loaded_version)
+        _validate(model)
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "model_load", param)
+    except Exception as e:
+        # Usually a file still being written; retried once its version changes again
+        logging.error(f"[{param}] Hot reload of weights {version} failed: {e}")
+        with _lock:
+            _failed_versions[param] = version
+            _reload_stats["reload_failures"] += 1
+            _reloading.discard(param)
+        return
+
+    # Atomic swap: requests already holding the old model finish on it
+    with _lock:
+        _models[param] = model
+        _versions[param] = loaded_version
+        if quantized:
+            _quantized.add(param)
+        else:
+            _quantized.discard(param)
+        _reload_stats["reloads"] += 1
+        _reloading.discard(param)
+    logging.info(f"[{param}] Hot-swapped model weights to version {get_model_version(param)}")
+
+
+def _changed_version(param, claim=False):
+    """New weights version of a loaded model to reload (marked as reloading if `claim`), or None."""
+    try:
+        version = _file_version(_model_path(param))
+    except OSError:
+        return None
+    with _lock:
+        if (param not in _models or version == _versions.get(param)
+                or version == _failed_versions.get(param) or param in _reloading):
+            return None
+        if claim:
+            _reloading.add(param)
+    return version
+
+
+def changed_models():
+    """{param: version} of loaded models whose weights file changed since loading."""
+    changed = {}
+    for param in list(_models):
+        version = _changed_version(param)
+        if version is not None:
+            changed[param] = version
+    return changed
+
+
+def check_for_update(param):
+    """Start a background reload if latest_{param}.pt changed since it was loaded."""
+    version = _changed_version(param, claim=True)
+    if version is None:
+        return False
+    threading.Thread(target=_reload, args=(param, version), name=f"reload-{param}", daemon=True).start()
+    return True
+
+
+def reload_changed():
+    """Reload every changed model in this thread; returns the params now serving new weights."""
+    reloaded = []
+    for param in list(_models):
+        version = _changed_version(param, claim=True)
+        if version is None:
+            continue
+        _reload(param, version)
+        if get_model_version(param) == version:
+            reloaded.append(param)
+    return reloaded
+
+
+_watcher = None
+_watcher_stop = threading.Event()
+
+
+def start_model_watcher(interval=MODEL_RELOAD_INTERVAL, on_change=None):
+    """
+    Poll loaded models' weight files. By default changed models are hot-reloaded
+    in this process; `on_change({param: version})` replaces that (called once
+    per distinct set of changes, e.g. to have the gunicorn master reload).
+    """
+    global _watcher
+    if interval <= 0:
+        return None
+
+    def watch():
+        reported = {}
+        while not _watcher_stop.wait(interval):
+            if on_change is None:
+                for param in list(_models):
+                    check_for_update(param)
+                continue
+            changed = changed_models()
+            if changed and changed != reported:
+                on_change(changed)
+            reported = changed
+
+    _watcher_stop.clear()
+    _watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+    _watcher.start()
+    return _watcher
+
+
+def stop_model_watcher(timeout=5):
+    """Stop the watcher thread started by start_model_watcher (if any)."""
+    global _watcher
+    _watcher_stop.set()
+    if _watcher is not None:
+        _watcher.join(timeout)
+        _watcher = None
@@ -0,0 +1,76 @@
+# nasa_parser.py - Fast NASA POWER daily CSV parser (NumPy only, no pandas)
+#
+# Replaces read_csv + string YEAR/DOY concatenation + to_datetime with a single
+# numeric parse. Dates are computed with integer arithmetic as days since
+# 1970-01-01, and the -999 "missing" sentinel becomes NaN on the way in.
+#
+# NOTE: the same module is used by the inference service, the MLOps
+# retrainer and model-service/train.py; keep all copies in sync. See bench_parser.py for timings.
+
+import numpy as np
+
+SENTINEL = -999.0
+
+
+def _leap_days_before(year):
+    """Leap days in years [1, year)."""
+    y = year - 1
+    return y // 4 - y // 100 + y // 400
+
+
+def days_since_epoch(year, doy):
+    """Vectorized (YEAR, DOY) -> days since 1970-01-01."""
+    year = np.asarray(year, dtype=np.int64)
+    doy = np.asarray(doy, dtype=np.int64)
+    return 365 * (year - 1970) + _leap_days_before(year) - _leap_days_before(1970) + doy - 1
+
+
+def parse_csv(text, params):
+    """
+    Parse a NASA POWER daily point CSV response.
+    Returns (days, {param: float32 values}) with missing values as NaN.
+    Raises ValueError if a row does not have one number per column.
+    """
+    # The header grows by one line per requested parameter, so skip to its end marker
+    body = text.split("-END HEADER-", 1)[-1].strip()
+    header, _, data = body.partition("\n")
+    columns = [c.strip() for c in header.split(",")]
+
+    # Rows are flattened into one parse, so check their shape first: a short
+    # row would otherwise shift every later value into the wrong column
+    rows = [row for row in data.replace("\r", "").split("\n") if row.strip()]
+    bad = next((i for i, row in enumerate(rows) if row.count(",") != len(columns) - 1), None)
+    if bad is not None:
+        raise ValueError(f"NASA POWER CSV row {bad + 1} does not have {len(columns)} fields: {rows[bad]!r}")
+    flat = np.fromstring(",".join(rows), sep=",") if rows else np.zeros(0)
+    if flat.size != len(rows) * len(columns):
+        raise ValueError(f"NASA POWER CSV has non-numeric values ({flat.size} of {len(rows) * len(columns)} parsed)")
+    table = flat.reshape(-1, len(columns))
+
+    days = days_since_epoch(table[:, columns.index("YEAR")], table[:, columns.index("DOY")])
+
+    values = {}
+    for param in params:
+        column = table[:, columns.index(param)].astype(np.float32)
+        column[column == SENTINEL] = np.nan
+        values[param] = column
+
+    return days, values
+
+
+def fill_gaps(values):
+    """
+    Linearly interpolate interior NaNs and drop leading/trailing ones
+    (e.g. the most recent days NASA has not published yet).
+    """
+    values = np.asarray(values, dtype=np.float32)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return values[:0]
+    values = values[valid[0]:valid[-1] + 1]
+    missing = np.isnan(values)
+    if missing.any():
+        values = values.copy()
+        idx = np.arange(len(values))
+        values[missing] = np.interp(idx[missing], idx[~missing], values[~missing])
+    return values
@@ -0,0 +1,142 @@
+# norm_stats.py - Persisted per-(location, param) normalization statistics
+#
+# The model only sees the last T_IN days, but they are normalized with the mean
+# and std of ~5 years of history. Keeping those two numbers on the model PVC
+# (next to the weights) lets request-time fetches ask NASA for the recent window
+# only. Stats older than NORM_STATS_MAX_AGE are refreshed in the background from
+# a full-history fetch while requests keep using the previous values.
+#
+# Entries are rows in a SQLite file shared by every worker and replica: a put
+# is one upsert of its own key (SQLite's file lock serializes writers), so
+# concurrent writers never overwrite each other's locations.
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+import grid
+
+NORM_STATS_DB = os.getenv("NORM_STATS_DB", os.path.join("models", "norm_stats.db"))
+# JSON file written by earlier versions; imported once into an empty database
+NORM_STATS_LEGACY_PATH = os.getenv("NORM_STATS_PATH", os.path.join("models", "norm_stats.json"))
+NORM_STATS_MAX_AGE = float(os.getenv("NORM_STATS_MAX_AGE", str(7 * 24 * 3600)))
+# Only trust statistics computed over at least this many days
+NORM_STATS_MIN_DAYS = int(os.getenv("NORM_STATS_MIN_DAYS", "365"))
+
+_FIELDS = ("mean", "std", "count", "computed_at")
+
+_lock = threading.Lock()
+_ready_path = None
+_refreshing = set()
+
+
+def _key(lat, lon, param):
+    lat, lon = grid.canonical(lat, lon)
+    return f"{param}|{lat:.4f}|{lon:.4f}"
+
+
+def _connect():
+    return sqlite3.connect(NORM_STATS_DB, timeout=5)
+
+
+def _ensure_schema():
+    global _ready_path
+    if _ready_path == NORM_STATS_DB:
+        return
+    directory = os.path.dirname(NORM_STATS_DB)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS norm_stats ("
+            "key TEXT PRIMARY KEY, mean REAL NOT NULL, std REAL NOT NULL, "
+            "count INTEGER NOT NULL, computed_at REAL NOT NULL)"
+        )
+        if conn.execute("SELECT COUNT(*) FROM norm_stats").fetchone()[0] == 0:
+            _import_legacy(conn)
+    _ready_path = NORM_STATS_DB
+
+
+def _import_legacy(conn):
+    try:
+        with open(NORM_STATS_LEGACY_PATH, "r") as f:
+            legacy = json.load(f)
+    except (OSError, ValueError):
+        return
+    conn.executemany(
+        "INSERT OR IGNORE INTO norm_stats VALUES (?, ?, ?, ?, ?)",
+        [(key, *(entry[f] for f in _FIELDS)) for key, entry in legacy.items()],
+    )
+    logging.info(f"Imported {len(legacy)} normalization stats from {NORM_STATS_LEGACY_PATH}")
+
+
+def get(lat, lon, param):
+    """Return {"mean", "std", "count", "computed_at"} or None."""
+    if not os.path.exists(NORM_STATS_DB) and not os.path.exists(NORM_STATS_LEGACY_PATH):
+        return None
+    try:
+        _ensure_schema()
+        with _connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM norm_stats WHERE key = ?", (_key(lat, lon, param),)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read {NORM_STATS_DB}: {e}")
+        return None
+    return dict(zip(_FIELDS, row)) if row else None
+
+
+def is_stale(entry):
+    return time.time() - entry["computed_at"] > NORM_STATS_MAX_AGE
+
+
+def version(entry):
+    """Identifies the stats a forecast was normalized with (part of the result cache key)."""
+    return "none" if entry is None else f"{entry['computed_at']:.3f}"
+
+
+def put(lat, lon, param, series):
+    """Compute mean/std over a full-history series and persist them."""
+    if len(series) < NORM_STATS_MIN_DAYS:
+        return None
+    std = float(series.std())
+    entry = {
+        "mean": float(series.mean()),
+        "std": std if std > 0 else 1.0,
+        "count": int(len(series)),
+        "computed_at": time.time(),
+    }
+    try:
+        _ensure_schema()
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO norm_stats VALUES (?, ?, ?, ?, ?)",
+                (_key(lat, lon, param), *(entry[f] for f in _FIELDS)),
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Could not persist {NORM_STATS_DB}: {e}")
+    return entry
+
+
+def refresh_async(lat, lon, param, fetch_full_series):
+    """Recompute stats in a background thread (at most one refresh per key)."""
+    key = _key(lat, lon, param)
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            put(lat, lon, param, fetch_full_series())
+        except Exception as e:
+            logging.warning(f"Normalization stats refresh failed for {key}: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name=f"norm-stats-{key}", daemon=True).start()
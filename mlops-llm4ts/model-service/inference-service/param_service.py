@@ -1,24 +1,124 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-from forecast import run_forecast
+from forecast import (
+    run_forecast, run_forecast_batch, run_forecast_multi, forecast_cache, batching_stats
+)
+from coalescing import SingleFlight, CoalescingTimeout
+from forecast_store import store as precomputed_store
+from forecast_cache import location_key
+import nasa_client
+import model_loader
+import inference_backend
+import warmup
+import cpu_quota
+import metrics
+import profiling
 from utils.logging import configure_logging
 import logging
+import os
+import time
 #git
 # --- CONFIGURATION ---
 APP_VERSION = "1.0.0"
+# How long a duplicate request waits on the identical in-flight forecast
+COALESCE_TIMEOUT = float(os.getenv("COALESCE_TIMEOUT", "60"))
+# Upper bound on locations accepted by /forecast/batch
+BATCH_MAX_LOCATIONS = int(os.getenv("BATCH_MAX_LOCATIONS", "500"))
+# Honour "X-Profile: 1" from clients. Off by default: the endpoint is
+# unauthenticated, so enable it per deployment while investigating.
+PROFILE_ON_REQUEST = os.getenv("PROFILE_ON_REQUEST", "false").lower() == "true"
 
 app = Flask(__name__)
 CORS(app)
 configure_logging(app)
 
+# Identical (grid cell, property) requests share one run_forecast call
+forecast_flight = SingleFlight(timeout=COALESCE_TIMEOUT)
+
+
+# --- METRICS ---
+@app.before_request
+def _start_request_timer():
+    g.started_at = time.perf_counter()
+    g.endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.IN_FLIGHT.inc(g.endpoint)
+
+@app.after_request
+def _observe_request(response):
+    if "started_at" in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.started_at, g.endpoint, str(response.status_code))
+    return response
+
+@app.teardown_request
+def _end_request(exc):
+    if "endpoint" in g:
+        metrics.IN_FLIGHT.dec(g.endpoint)
+
+@metrics.register_collector
+def _service_metrics():
+    """Counters/gauges the service modules already keep, read at scrape time."""
+    cache = forecast_cache.stats()
+    flight = forecast_flight.stats()
+    upstream = nasa_client.client.stats()
+    reloads = model_loader.reload_stats()
+    backends = inference_backend.backend_stats()["models"]
+    return [
+        ("forecast_cache_events", "counter", "Forecast result cache lookups and evictions.",
+         [({"event": k}, cache[k]) for k in ("hits", "backend_hits", "misses", "evictions")]),
+        ("forecast_precomputed_lookups", "counter", "Precomputed forecast store lookups.",
+         [({"result": k}, v) for k, v in precomputed_store.stats().items()]),
+        ("forecast_coalesced_requests", "counter", "Requests that joined an identical in-flight forecast.",
+         [({}, flight["coalesced"])]),
+        ("nasa_upstream_events", "counter", "NASA POWER client requests, retries and errors.",
+         [({"event": k}, v) for k, v in upstream.items()
+          if isinstance(v, int) and not isinstance(v, bool)]),
+        ("nasa_breaker_open", "gauge", "1 while the NASA POWER circuit breaker is open.",
+         [({}, int(upstream["breaker_open"]))]),
+        ("model_reloads", "counter", "Model hot reloads.",
+         [({"result": "success"}, reloads["reloads"]), ({"result": "failure"}, reloads["reload_failures"])]),
+        ("forecast_in_flight", "gauge", "Distinct forecasts currently being computed.",
+         [({}, flight["in_flight"])]),
+        ("forecast_batch_queue_depth", "gauge", "Windows waiting for a micro-batched forward.",
+         [({"param": p}, s["queue_depth"]) for p, s in batching_stats().items()]),
+        ("forecast_model_info", "gauge", "Loaded model weights per property.",
+         [({"param": p, "version": v, "backend": backends.get(p, {}).get("backend", "eager")}, 1)
+          for p, v in model_loader.model_versions().items()]),
+    ]
+
+@app.route("/metrics")
+def metrics_route():
+    """Prometheus scrape endpoint."""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
 @app.route("/health")
 def health():
     return jsonify({"status": "up", "service": "param-service"}), 200
 
+@app.route("/ready")
+def ready():
+    """Readiness probe: 503 until the configured models are loaded and warmed up."""
+    status = warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
 @app.route("/version")
 def version():
-    """Returns the application version for the Frontend to display."""
-    return jsonify({"version": APP_VERSION}), 200
+    """Returns the application version (and active model weights) for the Frontend to display."""
+    return jsonify({"version": APP_VERSION, "models": model_loader.model_versions()}), 200
+
+@app.route("/stats")
+def stats():
+    """Internal counters for tuning (coalescing, result cache, batching, upstream)."""
+    return jsonify({
+        "coalescing": forecast_flight.stats(),
+        "forecast_cache": forecast_cache.stats(),
+        "batching": batching_stats(),
+        "nasa_client": nasa_client.client.stats(),
+        "model_reload": model_loader.reload_stats(),
+        "quantization": model_loader.quantization_stats(),
+        "inference_backend": inference_backend.backend_stats(),
+        "precomputed": precomputed_store.stats(),
+        "profiling": profiling.stats(),
+    }), 200
 
 @app.route("/forecast", methods=["POST"])
 def forecast():
@@ -26,21 +126,105 @@ def forecast():
     lat = data.get("lat")
     lon = data.get("lon")
     prop = data.get("property", "T2M")
+    # Optional multi-property mode: {"properties": ["T2M", "RH2M", "WS2M"]}
+    # returns {property: forecast} from a single upstream fetch.
+    props = data.get("properties")
     
     # Basic logging of the request
     # Note: In a microservice mesh, the auth service might pass a user token header
     # which we would log here. For now, we just log the params.
-    logging.info(f"Forecast request: lat={lat}, lon={lon}, prop={prop}")
-    
+    logging.info(f"Forecast request: lat={lat}, lon={lon}, prop={props or prop}")
+
+    # Requests in the same NASA POWER grid cell share fetches, results and flights
     try:
-        result = run_forecast(lat, lon, prop)
-        return jsonify(result), 200
+        cell = location_key(lat, lon)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid lat/lon: {e}"}), 400
+
+    if props:
+        if not isinstance(props, list):
+            return jsonify({"error": "properties must be a list"}), 400
+        props = list(dict.fromkeys(props))
+    unknown = [p for p in (props or [prop]) if p not in model_loader.PROPERTIES]
+    if unknown:
+        return jsonify({"error": f"Unknown properties {unknown}; expected {list(model_loader.PROPERTIES)}"}), 400
+    # Metric/trace label independent of the order the client listed properties in
+    label = ",".join(sorted(props)) if props else prop
+
+    # "X-Profile: 1" (when PROFILE_ON_REQUEST) or PROFILE_SAMPLE_RATE captures a rate-limited profile
+    profiled = profiling.should_profile(PROFILE_ON_REQUEST and request.headers.get("X-Profile") == "1")
+    try:
+        with profiling.profile(f"forecast-{cell}-{label.replace(',', '_')}", profiled) as trace:
+            if props:
+                # Hot locations are answered from the daily precomputed store
+                result = precomputed_store.lookup_many(lat, lon, props)
+                missing = [p for p in props if p not in result]
+                if missing:
+                    result.update(forecast_flight.do(
+                        (cell, tuple(missing)), run_forecast_multi, lat, lon, missing
+                    ))
+            else:
+                result = precomputed_store.lookup(lat, lon, prop)
+                if result is None:
+                    result = forecast_flight.do((cell, prop), run_forecast, lat, lon, prop)
+            # The body keeps its shape; the cell and the requested coordinates ride along
+            headers = {"X-Grid-Cell": cell, "X-Request-Lat": str(lat), "X-Request-Lon": str(lon)}
+            with metrics.stage("serialize", label):
+                body = jsonify(result)
+        if trace:
+            headers["X-Profile-Trace"] = os.path.basename(trace)
+        return body, 200, headers
+    except CoalescingTimeout as e:
+        logging.error(f"Prediction timed out: {e}")
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         logging.error(f"Prediction failed: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/forecast/batch", methods=["POST"])
+def forecast_batch():
+    data = request.json or {}
+    locations = data.get("locations")
+    prop = data.get("property", "T2M")
+
+    if not isinstance(locations, list) or not locations:
+        return jsonify({"error": "locations must be a non-empty list of {lat, lon}"}), 400
+    if len(locations) > BATCH_MAX_LOCATIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_LOCATIONS} locations per batch"}), 400
+    if not all(isinstance(loc, dict) for loc in locations):
+        return jsonify({"error": "Each location must be an object with lat and lon"}), 400
+    if prop not in model_loader.PROPERTIES:
+        return jsonify({"error": f"Unknown property {prop!r}; expected {list(model_loader.PROPERTIES)}"}), 400
+
+    logging.info(f"Batch forecast request: {len(locations)} locations, prop={prop}")
+
+    try:
+        results = []
+        for loc in locations:
+            lat, lon = loc.get("lat"), loc.get("lon")
+            forecast = precomputed_store.lookup(lat, lon, prop)
+            results.append(
+                {"lat": lat, "lon": lon, "cell": location_key(lat, lon), "forecast": forecast}
+                if forecast is not None else None
+            )
+        misses = [i for i, r in enumerate(results) if r is None]
+        if misses:
+            computed = run_forecast_batch([locations[i] for i in misses], prop)
+            for i, result in zip(misses, computed):
+                results[i] = result
+        with metrics.stage("serialize", prop):
+            body = jsonify({"property": prop, "results": results})
+        return body, 200
+    except Exception as e:
+        logging.error(f"Batch prediction failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == "__main__":
     # Param service might run on a different port if running locally side-by-side
     # but in a pod it would likely still use 5000 (mapped to something else externally)
     # We'll use 5001 default for local testing convenience to avoid conflict with Auth
+    # For several workers sharing preloaded models use gunicorn.conf.py instead
+    cpu_quota.configure_torch_threads()
+    warmup.start()
+    model_loader.start_model_watcher()
     app.run(host="0.0.0.0", port=5001)
@@ -0,0 +1,93 @@
+# precompute_forecasts.py - Daily batch job filling forecast_store for hot locations
+#
+# Runs after NASA POWER's daily refresh (k8s CronJob). For every property it
+# forecasts the configured locations through run_forecast_batch (concurrent
+# fetches + batched model forwards) and writes the results to the store that
+# param_service answers from.
+#
+# Locations come from PRECOMPUTE_LOCATIONS (JSON file with [{"lat": .., "lon": ..}])
+# and/or PRECOMPUTE_GRID ("lat_min,lat_max,lon_min,lon_max,step" in degrees).
+#
+# Usage: python precompute_forecasts.py
+
+import os
+import sys
+import json
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from forecast import run_forecast_batch
+from forecast_store import store
+import model_loader
+
+PRECOMPUTE_PROPERTIES = [
+    p.strip() for p in os.getenv("PRECOMPUTE_PROPERTIES", "T2M,RH2M,WS2M").split(",") if p.strip()
+]
+PRECOMPUTE_LOCATIONS = os.getenv("PRECOMPUTE_LOCATIONS", os.path.join("models", "hot_locations.json"))
+PRECOMPUTE_GRID = os.getenv("PRECOMPUTE_GRID", "")
+# Locations per run_forecast_batch call
+PRECOMPUTE_CHUNK = int(os.getenv("PRECOMPUTE_CHUNK", "200"))
+
+
+def grid_locations(spec):
+    """Every point of a regular lat/lon grid given as "lat_min,lat_max,lon_min,lon_max,step"."""
+    lat_min, lat_max, lon_min, lon_max, step = (float(v) for v in spec.split(","))
+    lats = np.arange(lat_min, lat_max + step / 2, step)
+    lons = np.arange(lon_min, lon_max + step / 2, step)
+    return [{"lat": round(float(lat), 4), "lon": round(float(lon), 4)} for lat in lats for lon in lons]
+
+
+def load_locations():
+    locations = []
+    if os.path.exists(PRECOMPUTE_LOCATIONS):
+        with open(PRECOMPUTE_LOCATIONS, "r") as f:
+            locations.extend(json.load(f))
+    if PRECOMPUTE_GRID:
+        locations.extend(grid_locations(PRECOMPUTE_GRID))
+    # Drop duplicates, keep order
+    return list({(loc["lat"], loc["lon"]): loc for loc in locations}.values())
+
+
+def precompute(param, locations):
+    """Forecast `locations` for one property and store them. Returns (stored, failed)."""
+    model_loader.load_model(param)
+    version = model_loader.get_model_version(param)
+    issue_date = datetime.now().date()
+    stored = failed = 0
+    for start in range(0, len(locations), PRECOMPUTE_CHUNK):
+        results = run_forecast_batch(locations[start:start + PRECOMPUTE_CHUNK], param)
+        items = [(r["lat"], r["lon"], r["forecast"]) for r in results if "forecast" in r]
+        for r in results:
+            if "error" in r:
+                logging.warning(f"[{param}] No forecast for ({r['lat']}, {r['lon']}): {r['error']}")
+        store.write(param, items, version, issue_date)
+        stored += len(items)
+        failed += len(results) - len(items)
+    return stored, failed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    locations = load_locations()
+    if not locations:
+        logging.error(f"No locations configured (PRECOMPUTE_LOCATIONS={PRECOMPUTE_LOCATIONS}, PRECOMPUTE_GRID={PRECOMPUTE_GRID!r})")
+        return 1
+
+    exit_code = 0
+    for param in PRECOMPUTE_PROPERTIES:
+        started = time.time()
+        try:
+            stored, failed = precompute(param, locations)
+        except Exception as e:
+            logging.error(f"[{param}] Precompute failed: {e}")
+            exit_code = 1
+            continue
+        logging.info(f"[{param}] Stored {stored} forecasts ({failed} failed) in {time.time() - started:.1f}s")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# quantization.py - Dynamic int8 inference mode for ForecastingModel (CPU)
+#
+# The GPT2 backbone and PatchReconstruction are quantized with
+# torch.ao.quantization.quantize_dynamic: weights are stored as int8 and
+# activations are quantized on the fly. GPT2 uses transformers' Conv1D (a
+# Linear with a transposed weight), which quantize_dynamic doesn't know, so
+# those layers are converted to nn.Linear first.
+#
+# Quantization only goes live if it passes an accuracy gate. The gate
+# backtests fp32 and int8 forecasts on held-out windows from the locally
+# stored NASA series. The quantized model is refused if its MAE is worse by
+# more than QUANTIZE_MAX_MAE_DELTA (in normalized units).
+
+import os
+import glob
+
+import numpy as np
+import torch
+import torch.nn as nn
+from transformers.pytorch_utils import Conv1D
+
+import series_store
+from model import T_IN, T_OUT
+
+QUANTIZE_MAX_MAE_DELTA = float(os.getenv("QUANTIZE_MAX_MAE_DELTA", "0.05"))
+QUANTIZE_BACKTEST_WINDOWS = int(os.getenv("QUANTIZE_BACKTEST_WINDOWS", "64"))
+
+
+def _conv1d_to_linear(module):
+    """Replace every transformers Conv1D under `module` with an equivalent nn.Linear."""
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features, device="meta")
+            linear.weight = nn.Parameter(child.weight.detach().t().contiguous(), requires_grad=False)
+            linear.bias = nn.Parameter(child.bias.detach(), requires_grad=False)
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def quantize_int8(model):
+    """
+    Quantize the backbone and reconstruction head in place (the encoders stay
+    fp32). The model is modified rather than deep-copied, so callers that need
+    the fp32 model too should load a second instance (cheap with mmap'd weights).
+    """
+    _conv1d_to_linear(model.backbone)
+    torch.ao.quantization.quantize_dynamic(model.backbone, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    torch.ao.quantization.quantize_dynamic(model.reconstructor, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model.eval()
+
+
+def backtest_windows(param, max_windows=QUANTIZE_BACKTEST_WINDOWS):
+    """
+    Normalized (inputs, targets) arrays of shape [N, T_IN] / [N, T_OUT] built
+    from the stored series of `param`. The windows don't overlap and are taken
+    from the most recent data, across all stored locations.
+    """
+    span = T_IN + T_OUT
+    inputs, targets = [], []
+    for path in sorted(glob.glob(os.path.join(series_store.SERIES_DIR, f"{param}_*.npy"))):
+        try:
+            values = np.load(path, mmap_mode="r")["value"].astype(np.float32)
+        except (OSError, ValueError):
+            continue
+        values[values == series_store.SENTINEL] = np.nan
+        std = np.nanstd(values)
+        if len(values) < span or not std > 0:
+            continue
+        values = (values - np.nanmean(values)) / std
+        for end in range(len(values), span - 1, -span):
+            window = values[end - span:end]
+            if not np.isnan(window).any():
+                inputs.append(window[:T_IN])
+                targets.append(window[T_IN:])
+    inputs, targets = inputs[:max_windows], targets[:max_windows]
+    if not inputs:
+        return None, None
+    return np.stack(inputs), np.stack(targets)
+
+
+def _mae(model, inputs, targets):
+    x = torch.from_numpy(inputs).unsqueeze(-1)
+    t = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(len(inputs), -1)
+    with torch.no_grad():
+        return float(np.abs(model(x, t).numpy() - targets).mean())
+
+
+def gate(param, model, quantized, max_mae_delta=None):
+    """Backtest both models. Returns (accepted, report)."""
+    if max_mae_delta is None:
+        max_mae_delta = QUANTIZE_MAX_MAE_DELTA
+    inputs, targets = backtest_windows(param)
+    if inputs is None:
+        return False, {"reason": "no backtest data"}
+    mae_fp32 = _mae(model, inputs, targets)
+    mae_int8 = _mae(quantized, inputs, targets)
+    report = {
+        "windows": len(inputs),
+        "mae_fp32": round(mae_fp32, 5),
+        "mae_int8": round(mae_int8, 5),
+        "max_mae_delta": max_mae_delta,
+    }
+    accepted = mae_int8 - mae_fp32 <= max_mae_delta
+    if not accepted:
+        report["reason"] = "MAE delta above threshold"
+    return accepted, report
@@ -0,0 +1,99 @@
+# series_store.py - Local persistent store of NASA POWER daily series
+#
+# Each (lat, lon, param) series lives in its own .npy file on the model PVC as a
+# structured array of (date, value) records, where `date` is days since 1970-01-01.
+# Files are memory-mapped on read and replaced atomically on write, so concurrent
+# readers never see a half-written series.
+
+import os
+import threading
+import time
+import logging
+
+import numpy as np
+
+import grid
+
+SERIES_DIR = os.getenv("SERIES_DIR", os.path.join("models", "series"))
+
+# Don't ask NASA for new days if the series was topped up this recently
+SERIES_REFRESH_SECONDS = int(os.getenv("SERIES_REFRESH_SECONDS", "3600"))
+
+# NASA POWER marks days that are not published yet (or missing) with -999;
+# the parser stores them as NaN, older files may still hold the raw sentinel
+SENTINEL = -999.0
+
+RECORD_DTYPE = np.dtype([("date", "<i4"), ("value", "<f4")])
+
+
+def _series_path(lat, lon, param):
+    # One file per grid cell (all points in a cell share the same series)
+    lat, lon = grid.canonical(lat, lon)
+    return os.path.join(SERIES_DIR, f"{param}_{lat:.4f}_{lon:.4f}.npy")
+
+
+def make_records(days, values):
+    """Pack parallel day-number / value arrays into store records."""
+    records = np.empty(len(days), dtype=RECORD_DTYPE)
+    records["date"] = days
+    records["value"] = values
+    return records
+
+
+def load_series(lat, lon, param):
+    """Return the stored records for a location (memory-mapped), or None."""
+    path = _series_path(lat, lon, param)
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable series file {path}: {e}")
+        return None
+
+
+def save_series(lat, lon, param, records):
+    """Atomically replace the stored series. Failures are logged, not raised."""
+    path = _series_path(lat, lon, param)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(SERIES_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(records, dtype=RECORD_DTYPE))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not persist series {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def merge_series(stored, fresh):
+    """Union of two record arrays by date, sorted; rows in `fresh` win."""
+    if stored is None or len(stored) == 0:
+        return fresh
+    combined = np.concatenate([fresh, np.asarray(stored)])
+    # np.unique keeps the first occurrence, i.e. the freshly fetched row
+    _, idx = np.unique(combined["date"], return_index=True)
+    return combined[idx]
+
+
+def resume_day(records):
+    """
+    First day that still has to be fetched: the day after the last published value.
+    Trailing sentinel days are re-requested because NASA fills them in later.
+    Returns None if nothing usable is stored.
+    """
+    values = records["value"]
+    published = np.flatnonzero((values != SENTINEL) & ~np.isnan(values))
+    if len(published) == 0:
+        return None
+    return int(records["date"][published[-1]]) + 1
+
+
+def is_fresh(lat, lon, param):
+    """True if the series was written within SERIES_REFRESH_SECONDS."""
+    try:
+        age = time.time() - os.path.getmtime(_series_path(lat, lon, param))
+    except OSError:
+        return False
+    return age < SERIES_REFRESH_SECONDS
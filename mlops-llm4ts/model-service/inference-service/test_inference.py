@@ -1,11 +1,27 @@
 import unittest
+import importlib.util
 import json
 import sys
 import os
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import requests
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from param_service import app
+import forecast
+import series_store
+from coalescing import SingleFlight
+from forecast_cache import ForecastCache, SQLiteBackend, make_key
+from batching import MicroBatcher
+import nasa_client
+import nasa_parser
+import norm_stats
 
 class TestInferenceService(unittest.TestCase):
     def setUp(self):
@@ -22,5 +38,659 @@ class TestInferenceService(unittest.TestCase):
         response = self.app.get('/version')
         self.assertEqual(response.status_code, 200)
 
+    def test_metrics_exposes_prometheus_text(self):
+        import metrics
+
+        self.app.get('/health')
+        with metrics.stage("parse", "T2M"):
+            pass
+        body = self.app.get('/metrics').get_data(as_text=True)
+
+        self.assertIn('# TYPE forecast_stage_seconds histogram', body)
+        self.assertIn('forecast_stage_seconds_bucket{stage="parse",param="T2M",le="+Inf"}', body)
+        self.assertIn('http_request_duration_seconds_count{endpoint="/health",status="200"}', body)
+        self.assertIn('forecast_cache_events_total{event="hits"}', body)
+        self.assertIn('model_reloads_total{result="success"}', body)
+
+    def test_failed_model_load_is_not_observed(self):
+        import metrics
+        import model_loader
+
+        before = dict(metrics.STAGE_SECONDS._values)
+        with patch.object(model_loader, "_build_model", side_effect=OSError("truncated")), \
+                patch.dict(model_loader._reload_stats, reload_failures=0), \
+                patch.dict(model_loader._failed_versions):
+            model_loader._reload("T2M", "v-bad")
+            self.assertEqual(model_loader._reload_stats["reload_failures"], 1)
+        self.assertEqual(
+            metrics.STAGE_SECONDS._values.get(("model_load", "T2M"), [0, 0, 0])[2],
+            before.get(("model_load", "T2M"), [0, 0, 0])[2],
+        )
+
+    def test_unknown_property_is_rejected(self):
+        response = self.app.post('/forecast', json={"lat": 1, "lon": 2, "properties": ["T2M", "bogus"]})
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/forecast/batch', json={"property": "bogus", "locations": [{"lat": 1, "lon": 2}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_requires_locations(self):
+        response = self.app.post('/forecast/batch', json={"property": "T2M"})
+        self.assertEqual(response.status_code, 400)
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight(timeout=5)
+        release = threading.Event()
+        calls = []
+
+        def slow(x):
+            calls.append(x)
+            release.wait(5)
+            return x * 2
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow, 21))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(calls, [21])
+        self.assertEqual(results, [42] * 4)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+class TestForecastCache(unittest.TestCase):
+    def test_lru_eviction_under_byte_cap(self):
+        cache = ForecastCache(max_bytes=70, ttl=60)
+        cache.put("a", [1] * 10)
+        cache.put("b", [2] * 10)
+        cache.get("a")
+        cache.put("c", [3] * 10)
+        self.assertEqual(cache.get("a"), [1] * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_key_rounds_location_and_tracks_versions(self):
+        k1 = make_key(13.1801, 77.8002, "T2M", 100, "v1", "2025-01-01")
+        self.assertEqual(k1, make_key(13.18, 77.80, "T2M", 100, "v1", "2025-01-01"))
+        self.assertNotEqual(k1, make_key(13.18, 77.80, "T2M", 101, "v1", "2025-01-01"))
+        self.assertNotEqual(k1, make_key(13.18, 77.80, "T2M", 100, "v2", "2025-01-01"))
+        self.assertNotEqual(k1, make_key(13.18, 77.80, "T2M", 100, "v1", "2025-01-01", "1700000000.000"))
+
+    def test_sqlite_backend_is_shared(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            ForecastCache(backend=SQLiteBackend(path)).put("k", [{"value": 1.5}])
+            other = ForecastCache(backend=SQLiteBackend(path))
+            self.assertEqual(other.get("k"), [{"value": 1.5}])
+            self.assertEqual(other.stats()["backend_hits"], 1)
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_concurrent_windows_share_one_forward(self):
+        import torch
+        seen_batches = []
+
+        def model_fn(x, t):
+            seen_batches.append(x.shape[0])
+            return x[:, -3:, 0] * 2
+
+        batcher = MicroBatcher(model_fn, max_batch_size=4, max_wait_ms=200)
+        results = {}
+
+        def call(i):
+            window = torch.full((1, 60, 1), float(i))
+            results[i] = batcher.submit(window, torch.arange(60.0).unsqueeze(0))
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(seen_batches, [4])
+        for i in range(4):
+            np.testing.assert_array_equal(results[i], [2.0 * i] * 3)
+        self.assertEqual(batcher.stats()["batch_sizes"], {4: 1})
+
+    def test_close_serves_queued_windows_then_stops(self):
+        import torch
+
+        batcher = MicroBatcher(lambda x, t: x[:, -1:, 0], max_batch_size=4, max_wait_ms=50)
+        result = {}
+        caller = threading.Thread(target=lambda: result.update(
+            row=batcher.submit(torch.ones(1, 60, 1), torch.arange(60.0).unsqueeze(0))
+        ))
+        caller.start()
+        time.sleep(0.01)
+        batcher.close()
+        caller.join()
+
+        np.testing.assert_array_equal(result["row"], [1.0])
+        self.assertFalse(batcher._worker.is_alive())
+        with self.assertRaises(RuntimeError):
+            batcher.submit(torch.ones(1, 60, 1), torch.arange(60.0).unsqueeze(0))
+
+class TestBatchForecast(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import torch
+        import model_loader
+        from model import ForecastingModel
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        torch.manual_seed(0)
+        torch.save(ForecastingModel().state_dict(), os.path.join(cls.tmp.name, "latest_T2M.pt"))
+        cls.patches = [
+            patch.object(model_loader, "MODELS_DIR", cls.tmp.name),
+            patch.dict(model_loader._models, clear=True),
+            patch.object(forecast, "forecast_cache", ForecastCache(max_bytes=0)),
+            patch.object(forecast, "BATCH_MAX_SIZE", 1),
+            patch.object(norm_stats, "NORM_STATS_DB", os.path.join(cls.tmp.name, "norm_stats.db")),
+        ]
+        for p in cls.patches:
+            p.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for p in cls.patches:
+            p.stop()
+        cls.tmp.cleanup()
+
+    def fake_records(self, lat, lon, params, history_days=forecast.HISTORY_DAYS):
+        days = np.arange(400)
+        values = (20 + 5 * np.sin(days / 30.0 + lat) + lon / 100.0).astype(np.float32)
+        return {p: series_store.make_records(days, values) for p in params}
+
+    def test_batch_matches_single_forecasts(self):
+        locations = [{"lat": 13.0, "lon": 77.5}, {"lat": 28.6}, {"lat": 19.1, "lon": 72.9}]
+        with patch.object(forecast, "fetch_nasa_records_multi", side_effect=self.fake_records) as fetch:
+            batch = forecast.run_forecast_batch(locations, "T2M")
+            single = [forecast.run_forecast(13.0, 77.5, "T2M"), forecast.run_forecast(19.1, 72.9, "T2M")]
+
+        self.assertIn("error", batch[1])
+        # First sight of a location fetches full history; afterwards persisted stats
+        # let the single forecasts ask for the recent window only
+        self.assertEqual(fetch.call_args_list[0].args[3], forecast.HISTORY_DAYS)
+        self.assertEqual(fetch.call_args_list[-1].args[3], forecast.RECENT_DAYS)
+        for result, expected in zip([batch[0], batch[2]], single):
+            np.testing.assert_allclose(
+                [d["value"] for d in result["forecast"]], [d["value"] for d in expected], rtol=1e-4
+            )
+
+    def test_precomputed_forecasts_are_served_without_fetching(self):
+        import forecast_store
+        import precompute_forecasts
+
+        store = forecast_store.ForecastStore(os.path.join(self.tmp.name, "precomputed.db"))
+        locations = [{"lat": 13.0, "lon": 77.5}, {"lat": 19.1, "lon": 72.9}]
+        with patch.object(forecast, "fetch_nasa_records_multi", side_effect=self.fake_records), \
+                patch.object(precompute_forecasts, "store", store):
+            self.assertEqual(precompute_forecasts.precompute("T2M", locations), (2, 0))
+
+        client = app.test_client()
+        with patch.object(forecast, "fetch_nasa_records_multi", side_effect=self.fake_records) as fetch, \
+                patch("param_service.precomputed_store", store):
+            single = client.post('/forecast', json={"lat": 13.001, "lon": 77.5, "property": "T2M"})
+            batch = client.post('/forecast/batch', json={"property": "T2M", "locations": locations})
+        fetch.assert_not_called()
+        self.assertEqual(single.status_code, 200)
+        self.assertEqual(len(single.get_json()), forecast.T_OUT)
+        self.assertTrue(all("forecast" in r for r in batch.get_json()["results"]))
+        self.assertEqual(store.stats()["hits"], 3)
+
+    def test_batch_computes_each_grid_cell_once(self):
+        locations = [{"lat": 28.61, "lon": 77.21}, {"lat": 28.7, "lon": 77.3}, {"lat": 95, "lon": 0}]
+        with patch.object(forecast, "fetch_nasa_records_multi", side_effect=self.fake_records) as fetch:
+            results = forecast.run_forecast_batch(locations, "T2M")
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(results[0]["cell"], results[1]["cell"])
+        self.assertEqual(results[0]["forecast"], results[1]["forecast"])
+        self.assertEqual((results[1]["lat"], results[1]["lon"]), (28.7, 77.3))
+        self.assertIn("error", results[2])
+
+    def test_profile_on_request_is_written_and_rate_limited(self):
+        import profiling
+
+        client = app.test_client()
+        profile_dir = os.path.join(self.tmp.name, "profiles")
+        with patch.object(forecast, "fetch_nasa_records_multi", side_effect=self.fake_records), \
+                patch.object(profiling, "PROFILE_DIR", profile_dir), \
+                patch.object(profiling, "PROFILE_MAX_PER_MINUTE", 1), \
+                patch.object(profiling, "_recent", []):
+            ignored = client.post('/forecast', json={"lat": 13.0, "lon": 77.5}, headers={"X-Profile": "1"})
+            with patch("param_service.PROFILE_ON_REQUEST", True):
+                first = client.post('/forecast', json={"lat": 13.0, "lon": 77.5}, headers={"X-Profile": "1"})
+                second = client.post('/forecast', json={"lat": 13.0, "lon": 77.5}, headers={"X-Profile": "1"})
+
+        # The header is ignored unless PROFILE_ON_REQUEST is enabled for the deployment
+        self.assertEqual(ignored.status_code, 200)
+        self.assertNotIn("X-Profile-Trace", ignored.headers)
+
+        self.assertEqual(first.status_code, 200)
+        trace = os.path.join(profile_dir, first.headers["X-Profile-Trace"])
+        self.assertTrue(os.path.exists(trace + ".pstats"))
+        with open(trace + ".trace.json") as f:
+            self.assertIn("ForecastingModel.forward", f.read())
+        self.assertNotIn("X-Profile-Trace", second.headers)
+
+    def test_profiled_request_traces_forward_with_batching_enabled(self):
+        import profiling
+
+        client = app.test_client()
+        profile_dir = os.path.join(self.tmp.name, "profiles-batched")
+        with patch.object(forecast, "fetch_nasa_records_multi", side_effect=self.fake_records), \
+                patch.object(forecast, "BATCH_MAX_SIZE", 8), \
+                patch.object(profiling, "PROFILE_DIR", profile_dir), \
+                patch.object(profiling, "_recent", []), \
+                patch("param_service.PROFILE_ON_REQUEST", True):
+            response = client.post('/forecast', json={"lat": 14.0, "lon": 76.5}, headers={"X-Profile": "1"})
+
+        self.assertEqual(response.status_code, 200)
+        with open(os.path.join(profile_dir, response.headers["X-Profile-Trace"]) + ".trace.json") as f:
+            trace = f.read()
+        self.assertIn("ForecastingModel.forward", trace)
+        self.assertIn("aten::", trace)
+
+    def test_exported_backend_is_cached_and_falls_back_on_mismatch(self):
+        import inference_backend
+        import model_loader
+
+        path = os.path.join(self.tmp.name, "latest_T2M.pt")
+        model, version = model_loader._build_model(path)
+        engine, name = inference_backend.select("T2M", model, path, version, mode="torchscript")
+        self.assertEqual(name, "torchscript")
+        self.assertTrue(os.path.exists(inference_backend._artifact_path(path, version, "ts")))
+        checked = inference_backend.backend_stats()["models"]["T2M"]["checked_batch_sizes"]
+        self.assertIn(forecast.BATCH_FORWARD_CHUNK, checked)
+
+        with patch.object(inference_backend, "check_parity", side_effect=AssertionError("mismatch")):
+            engine, name = inference_backend.select("T2M", model, path, version, mode="torchscript")
+        self.assertEqual(name, "eager")
+        self.assertIs(engine, model)
+
+    def test_auto_backend_needs_min_speedup_over_eager(self):
+        import inference_backend
+
+        model = lambda x, t: x[:, :10, 0]
+        builders = {name: lambda *a: (lambda x, t: x[:, :10, 0]) for name in ("torchscript", "onnx")}
+        # eager runs at 10ms; each candidate's time is taken in build order
+        for candidate_ms, expected in (([9.5, 9.0], "eager"), ([9.5, 7.0], "onnx")):
+            remaining = list(candidate_ms)
+            bench = lambda engine: 10.0 if engine is model else remaining.pop(0)
+            with patch.object(inference_backend, "BUILDERS", builders), \
+                    patch.object(inference_backend, "_benchmark_ms", side_effect=bench), \
+                    patch.object(inference_backend, "BACKEND_MIN_SPEEDUP", 1.2):
+                engine, name = inference_backend.select("T2M", model, "unused.pt", "v1", mode="auto")
+            self.assertEqual(name, expected)
+            self.assertEqual(inference_backend.backend_stats()["models"]["T2M"]["backend"], expected)
+
+    def test_mmap_load_matches_eager_model(self):
+        import torch
+        import model_loader
+        from model import ForecastingModel, T_IN
+
+        reference = ForecastingModel().eval()
+        path = os.path.join(self.tmp.name, "reference.pt")
+        torch.save(reference.state_dict(), path)
+        loaded, _ = model_loader._build_model(path)
+        self.assertIn("rss_delta_mb", model_loader.reload_stats()["last_load"])
+
+        self.assertFalse(any(t.is_meta for t in loaded.state_dict().values()))
+        self.assertFalse(any(b.is_meta for b in loaded.buffers()))
+        x = torch.randn(2, T_IN, 1)
+        t = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(2, -1)
+        with torch.no_grad():
+            torch.testing.assert_close(loaded(x, t), reference(x, t))
+
+    def test_concurrent_loads_restore_register_parameter(self):
+        import threading
+        import torch
+        import torch.nn as nn
+        import model_loader
+
+        original = nn.Module.register_parameter
+        inside, release = threading.Event(), threading.Event()
+
+        def hold_meta_context():
+            with model_loader._empty_weights():
+                inside.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_meta_context)
+        holder.start()
+        inside.wait(5)
+        # Other threads build real parameters while a load is in progress
+        self.assertFalse(nn.Linear(2, 2).weight.is_meta)
+        with model_loader._empty_weights():
+            self.assertTrue(nn.Linear(2, 2).weight.is_meta)
+        release.set()
+        holder.join()
+
+        self.assertIs(nn.Module.register_parameter, original)
+        self.assertFalse(nn.Linear(2, 2).weight.is_meta)
+
+    def test_int8_quantization_is_gated_on_backtest_mae(self):
+        import torch
+        import model_loader
+        import quantization
+        from model import ForecastingModel, T_IN
+
+        path = os.path.join(self.tmp.name, "latest_T2M.pt")
+        model, version = model_loader._build_model(path)
+        quantized = quantization.quantize_int8(model_loader._build_model(path)[0])
+        x = torch.randn(4, T_IN, 1)
+        t = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(4, -1)
+        with torch.no_grad():
+            self.assertLess((model(x, t) - quantized(x, t)).abs().max().item(), 0.1)
+
+        days = np.arange(400)
+        with patch.object(series_store, "SERIES_DIR", os.path.join(self.tmp.name, "series")), \
+                patch.object(model_loader, "MODEL_QUANTIZE", "int8"), \
+                patch.dict(model_loader._quantization_reports, clear=True):
+            series_store.save_series(13.0, 77.5, "T2M", series_store.make_records(days, np.sin(days / 30.0)))
+            served, active = model_loader._maybe_quantize("T2M", model, version)
+            self.assertTrue(active)
+            self.assertIsNot(served, model)
+            with patch.object(quantization, "QUANTIZE_MAX_MAE_DELTA", -1.0):
+                served, active = model_loader._maybe_quantize("T2M", model, version)
+            self.assertFalse(active)
+            self.assertIs(served, model)
+
+    def test_ready_only_after_warm_up(self):
+        import warmup
+
+        client = app.test_client()
+        with patch.dict(warmup._state, ready=False, error=None, timings={}):
+            self.assertEqual(client.get('/ready').status_code, 503)
+            warmup.run(["T2M"])
+            response = client.get('/ready')
+            self.assertEqual(response.status_code, 200)
+            timings = response.get_json()["timings_ms"]
+            self.assertIn("T2M.load", timings)
+            self.assertIn("T2M.forward_b1", timings)
+
+class TestModelHotReload(unittest.TestCase):
+    def setUp(self):
+        import torch
+        import model_loader
+        from model import ForecastingModel
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        torch.save(ForecastingModel().state_dict(), os.path.join(self.tmp.name, "latest_T2M.pt"))
+        # Reloads replace the weights and the loader state: keep both private to each test
+        for patcher in (
+            patch.object(model_loader, "MODELS_DIR", self.tmp.name),
+            patch.dict(model_loader._models, clear=True),
+            patch.dict(model_loader._versions, clear=True),
+            patch.dict(model_loader._failed_versions, clear=True),
+            patch.dict(model_loader._reload_stats),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_hot_reload_swaps_model_after_weights_change(self):
+        import torch
+        import model_loader
+        from model import ForecastingModel
+
+        old = model_loader.load_model("T2M")
+        old_version = model_loader.get_model_version("T2M")
+        path = os.path.join(self.tmp.name, "latest_T2M.pt")
+        # Replace atomically like the retrainer: the loaded weights are memory-mapped
+        torch.save(ForecastingModel().state_dict(), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        self.assertTrue(model_loader.check_for_update("T2M"))
+        while "T2M" in model_loader.reload_stats()["reloading"]:
+            time.sleep(0.05)
+
+        self.assertIsNot(model_loader.load_model("T2M"), old)
+        self.assertNotEqual(model_loader.get_model_version("T2M"), old_version)
+        self.assertFalse(model_loader.check_for_update("T2M"))
+
+    def test_watcher_reports_changes_and_master_reloads_in_place(self):
+        import torch
+        import model_loader
+        from model import ForecastingModel
+
+        old = model_loader.load_model("T2M")
+        path = os.path.join(self.tmp.name, "latest_T2M.pt")
+        torch.save(ForecastingModel().state_dict(), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 2 * 10**9))
+
+        reported = []
+        watcher = model_loader.start_model_watcher(interval=0.05, on_change=reported.append)
+        try:
+            deadline = time.time() + 5
+            while not reported and time.time() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.2)
+        finally:
+            model_loader.stop_model_watcher()
+        self.assertFalse(watcher.is_alive())
+        # One notification per distinct change, and no reload in the watching process
+        self.assertEqual(len(reported), 1)
+        self.assertIs(model_loader.load_model("T2M"), old)
+
+        self.assertEqual(model_loader.reload_changed(), ["T2M"])
+        self.assertIsNot(model_loader.load_model("T2M"), old)
+        self.assertEqual(model_loader.changed_models(), {})
+
+class TestNormStats(unittest.TestCase):
+    def test_concurrent_writers_keep_every_location(self):
+        import multiprocessing
+
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = os.path.join(tmp, "norm_stats.json")
+            with open(legacy, "w") as f:
+                json.dump({"T2M|0.0000|0.0000": {"mean": 1.0, "std": 2.0, "count": 400, "computed_at": 1.0}}, f)
+            with patch.object(norm_stats, "NORM_STATS_DB", os.path.join(tmp, "norm_stats.db")), \
+                    patch.object(norm_stats, "NORM_STATS_LEGACY_PATH", legacy):
+                self.assertEqual(norm_stats.get(0, 0, "T2M")["mean"], 1.0)
+                series = np.arange(400, dtype=np.float32)
+                ctx = multiprocessing.get_context("fork")
+                writers = [
+                    ctx.Process(target=norm_stats.put, args=(10 * i, 20, "T2M", series)) for i in range(4)
+                ]
+                for w in writers:
+                    w.start()
+                for w in writers:
+                    w.join()
+                for i in range(4):
+                    self.assertEqual(norm_stats.get(10 * i, 20, "T2M")["count"], 400)
+                self.assertEqual(norm_stats.version(None), "none")
+
+class TestAsyncService(unittest.TestCase):
+    def test_health_and_forecast_contract(self):
+        import asyncio
+        import async_service
+
+        async def scenario():
+            client = async_service.app.test_client()
+            health = await client.get('/health')
+            with patch.object(async_service, "fetch_nasa_records_multi",
+                              return_value={"T2M": series_store.make_records([], [])}):
+                bad = await client.post('/forecast', json={"lat": 1, "lon": 2, "property": "T2M"})
+            return health.status_code, bad.status_code, await bad.get_json()
+
+        health, status, body = asyncio.run(scenario())
+        self.assertEqual(health, 200)
+        self.assertEqual(status, 500)
+        self.assertIn("Not enough data", body["error"])
+
+    def test_fetch_uses_nasa_client_path_and_stats(self):
+        import asyncio
+        import async_service
+        import forecast
+
+        async def scenario():
+            records = await async_service.fetch_nasa_records_multi(1, 2, ["T2M"], 90)
+            stats = await async_service.app.test_client().get('/stats')
+            return records, stats.status_code, await stats.get_json()
+
+        with patch.object(forecast, "fetch_nasa_records_multi", return_value={"T2M": "stored"}) as fetch:
+            records, status, body = asyncio.run(scenario())
+        fetch.assert_called_once_with(1, 2, ["T2M"], 90)
+        self.assertEqual(records, {"T2M": "stored"})
+        self.assertEqual(status, 200)
+        self.assertIn("breaker_open", body["nasa_client"])
+
+    def test_requests_are_timed_and_counted(self):
+        import asyncio
+        import async_service
+        import metrics
+
+        def count():
+            entry = metrics.REQUEST_SECONDS._values.get(("/health", "200"))
+            return entry[2] if entry else 0
+
+        before = count()
+
+        async def scenario():
+            client = async_service.app.test_client()
+            await client.get('/health')
+            bad = await client.post('/forecast', json={"lat": 1, "lon": 2, "property": "bogus"})
+            return bad.status_code
+
+        self.assertEqual(asyncio.run(scenario()), 400)
+        self.assertEqual(count(), before + 1)
+        self.assertEqual(metrics.IN_FLIGHT._values.get(("/health",)), 0)
+
+class TestCpuQuota(unittest.TestCase):
+    def test_threads_follow_cgroup_quota(self):
+        import cpu_quota
+
+        with patch.object(cpu_quota, "_cgroup_quota", return_value=0.5):
+            self.assertEqual(cpu_quota.default_workers(), 1)
+            self.assertEqual(cpu_quota.threads_per_worker(1), 1)
+        with patch.object(cpu_quota, "_cgroup_quota", return_value=4.0), \
+                patch.object(cpu_quota.os, "sched_getaffinity", return_value=set(range(16))):
+            self.assertEqual(cpu_quota.default_workers(), 4)
+            self.assertEqual(cpu_quota.threads_per_worker(2), 2)
+
+class TestGrid(unittest.TestCase):
+    def test_points_in_a_cell_share_keys(self):
+        import grid
+
+        self.assertEqual(grid.cell_center(13.1, 77.8), (13.0, 77.5))
+        self.assertEqual(grid.cell_id(13.1, 77.8), grid.cell_id(12.9, 77.7))
+        self.assertNotEqual(grid.cell_id(13.1, 77.8), grid.cell_id(13.3, 77.8))
+        self.assertEqual(grid.cell_id(0, 180), grid.cell_id(0, -180))
+        self.assertEqual(series_store._series_path(13.1, 77.8, "T2M"), series_store._series_path(12.9, 77.7, "T2M"))
+        self.assertEqual(make_key(13.1, 77.8, "T2M", 1, "v", "d"), make_key(12.9, 77.7, "T2M", 1, "v", "d"))
+
+class TestNasaClient(unittest.TestCase):
+    def ok_response(self, text="YEAR,DOY,T2M"):
+        response = MagicMock(text=text)
+        response.raise_for_status.return_value = None
+        return response
+
+    def test_retries_transient_errors_then_succeeds(self):
+        client = nasa_client.NasaPowerClient()
+        flaky = [requests.exceptions.ConnectionError("reset"), self.ok_response("body")]
+        with patch.object(client.session, "get", side_effect=flaky), \
+                patch.object(nasa_client.time, "sleep"):
+            self.assertEqual(client.get_text("http://nasa"), "body")
+        self.assertEqual(client.stats()["retries"], 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        client = nasa_client.NasaPowerClient()
+        with patch.object(client.session, "get", side_effect=requests.exceptions.Timeout("slow")) as get, \
+                patch.object(nasa_client.time, "sleep"), \
+                patch.object(nasa_client, "NASA_MAX_RETRIES", 0):
+            for _ in range(nasa_client.NASA_BREAKER_THRESHOLD):
+                with self.assertRaises(requests.exceptions.Timeout):
+                    client.get_text("http://nasa")
+            with self.assertRaises(nasa_client.CircuitOpenError):
+                client.get_text("http://nasa")
+        self.assertEqual(get.call_count, nasa_client.NASA_BREAKER_THRESHOLD)
+        self.assertTrue(client.stats()["breaker_open"])
+
+class TestNasaParser(unittest.TestCase):
+    @unittest.skipUnless(importlib.util.find_spec("pandas"), "pandas reference parser not installed")
+    def test_matches_calendar_and_maps_sentinel(self):
+        import bench_parser
+        text = bench_parser.make_response(800)
+        expected = bench_parser.pandas_path(text)
+        days, values = nasa_parser.parse_csv(text, ["T2M"])
+
+        np.testing.assert_allclose(values["T2M"][:-3], expected[:-3])
+        self.assertTrue(np.isnan(values["T2M"][-3:]).all())
+        self.assertEqual(str(np.datetime64(int(days[-1]), "D")), "2022-03-11")
+        np.testing.assert_array_equal(nasa_parser.fill_gaps(np.array([np.nan, 1, np.nan, 3, np.nan])), [1, 2, 3])
+
+    def test_rejects_rows_with_missing_fields(self):
+        text = "-END HEADER-\nYEAR,DOY,T2M,RH2M\n2022,1,10.5,80.0\n2022,2,11.0\n2022,3,12.0,70.0,1.0\n"
+        with self.assertRaisesRegex(ValueError, "row 2"):
+            nasa_parser.parse_csv(text, ["T2M", "RH2M"])
+        with self.assertRaisesRegex(ValueError, "non-numeric"):
+            nasa_parser.parse_csv("-END HEADER-\nYEAR,DOY,T2M\n2022,1,n/a\n", ["T2M"])
+
+class TestSeriesStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = patch.object(series_store, "SERIES_DIR", self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_merge_prefers_fresh_rows(self):
+        stored = series_store.make_records([1, 2, 3], [10.0, 20.0, -999.0])
+        fresh = series_store.make_records([3, 4], [30.0, 40.0])
+        merged = series_store.merge_series(stored, fresh)
+        self.assertEqual(list(merged["date"]), [1, 2, 3, 4])
+        self.assertEqual(list(merged["value"]), [10.0, 20.0, 30.0, 40.0])
+        self.assertEqual(series_store.resume_day(stored), 3)
+
+    def test_fetch_only_requests_missing_days(self):
+        def fake_download(lat, lon, params, start_day, end_day):
+            days = np.arange(start_day, end_day + 1)
+            return {p: series_store.make_records(days, days.astype(np.float32)) for p in params}
+
+        with patch.object(forecast, "download_nasa_series", side_effect=fake_download) as dl:
+            first = forecast.fetch_nasa_data(13.18, 77.8, "T2M")
+            self.assertEqual(len(first), forecast.HISTORY_DAYS + 1)
+
+            # Pretend the last three days were not published yet and the file is stale
+            records = np.array(series_store.load_series(13.18, 77.8, "T2M"))
+            records["value"][-3:] = series_store.SENTINEL
+            series_store.save_series(13.18, 77.8, "T2M", records)
+            with patch.object(series_store, "SERIES_REFRESH_SECONDS", 0):
+                second = forecast.fetch_nasa_data(13.18, 77.8, "T2M")
+
+        start_day, end_day = dl.call_args_list[1].args[3:]
+        self.assertEqual(end_day - start_day, 2)
+        np.testing.assert_array_equal(first, second)
+
+    def test_multi_fetch_requests_only_stale_params_once(self):
+        def fake_download(lat, lon, params, start_day, end_day):
+            days = np.arange(start_day, end_day + 1)
+            return {p: series_store.make_records(days, np.ones(len(days))) for p in params}
+
+        with patch.object(forecast, "download_nasa_series", side_effect=fake_download) as dl:
+            forecast.fetch_nasa_records(13.18, 77.8, "T2M")
+            records = forecast.fetch_nasa_records_multi(13.18, 77.8, ["T2M", "RH2M", "WS2M"])
+
+        self.assertEqual(dl.call_count, 2)
+        self.assertEqual(dl.call_args_list[1].args[2], ["RH2M", "WS2M"])
+        self.assertEqual(sorted(records), ["RH2M", "T2M", "WS2M"])
+
+    def test_serves_stored_series_when_upstream_fails(self):
+        days = np.arange(forecast._day_number(forecast.datetime.now()) - forecast.HISTORY_DAYS - 1,
+                         forecast._day_number(forecast.datetime.now()) - 5)
+        series_store.save_series(13.18, 77.8, "T2M", series_store.make_records(days, np.ones(len(days))))
+        with patch.object(series_store, "SERIES_REFRESH_SECONDS", 0), \
+                patch.object(forecast, "download_nasa_series",
+                             side_effect=nasa_client.CircuitOpenError("open")):
+            series = forecast.fetch_nasa_data(13.18, 77.8, "T2M")
+        self.assertEqual(len(series), forecast.HISTORY_DAYS - 5)
+
 if __name__ == '__main__':
     unittest.main()
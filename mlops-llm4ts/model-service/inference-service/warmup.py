@@ -0,0 +1,103 @@
+# warmup.py - Eager model warm-up and readiness state for the inference service
+#
+# A fresh pod otherwise pays for model construction, torch.load and the first
+# (slow, allocator-cold) forward passes on its first /forecast. At startup we
+# load the configured properties' models and run a few synthetic forwards at
+# the batch sizes the service actually uses; /ready reports 503 until that is
+# done so the Service/HPA only route traffic to warm pods.
+
+import os
+import time
+import logging
+import threading
+
+import torch
+
+import model_loader
+from model import T_IN
+from forecast import BATCH_MAX_SIZE, BATCH_FORWARD_CHUNK
+
+# Properties served by this pod (one inference deployment per property)
+WARMUP_PROPERTIES = [
+    p.strip() for p in os.getenv("WARMUP_PROPERTIES", os.getenv("PROPERTY", "T2M")).split(",") if p.strip()
+]
+# Single request, micro-batch and /forecast/batch chunk sizes
+WARMUP_BATCH_SIZES = sorted({
+    int(b) for b in os.getenv(
+        "WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE},{BATCH_FORWARD_CHUNK}"
+    ).split(",") if b.strip()
+})
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "3"))
+# Wait before retrying when weights are missing/unreadable (e.g. PVC not populated yet)
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+_state = {"ready": False, "error": None, "timings": {}}
+_lock = threading.Lock()
+
+
+def is_ready():
+    return _state["ready"]
+
+
+def status():
+    with _lock:
+        return {
+            "ready": _state["ready"],
+            "properties": WARMUP_PROPERTIES,
+            "error": _state["error"],
+            "timings_ms": dict(_state["timings"]),
+        }
+
+
+def _warm_forwards(model, batch_size):
+    x = torch.zeros(batch_size, T_IN, 1)
+    t = torch.arange(T_IN, dtype=torch.float32).unsqueeze(0).expand(batch_size, -1)
+    with torch.no_grad():
+        for _ in range(WARMUP_ITERATIONS):
+            model(x, t)
+
+
+def warm_up(params=None):
+    """Load and warm every configured model. Returns {step: milliseconds}; raises on failure."""
+    params = params or WARMUP_PROPERTIES
+    timings = {}
+    started = time.perf_counter()
+    for param in params:
+        step = time.perf_counter()
+        model = model_loader.load_model(param)
+        timings[f"{param}.load"] = (time.perf_counter() - step) * 1000
+        for batch_size in WARMUP_BATCH_SIZES:
+            step = time.perf_counter()
+            _warm_forwards(model, batch_size)
+            timings[f"{param}.forward_b{batch_size}"] = (time.perf_counter() - step) * 1000
+    timings["total"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def run(params=None):
+    """Warm up until it succeeds, then mark the service ready."""
+    while True:
+        try:
+            timings = warm_up(params)
+            break
+        except Exception as e:
+            logging.error(f"Model warm-up failed, retrying in {WARMUP_RETRY_SECONDS:.0f}s: {e}")
+            with _lock:
+                _state["error"] = str(e)
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+    mark_ready(timings)
+
+
+def mark_ready(timings):
+    with _lock:
+        _state.update(ready=True, error=None, timings={k: round(v, 1) for k, v in timings.items()})
+    breakdown = ", ".join(f"{k}={v:.1f}ms" for k, v in timings.items())
+    logging.info(f"Startup warm-up complete: {breakdown}")
+
+
+def start(params=None):
+    """Run the warm-up in a background thread so the server can answer probes meanwhile."""
+    thread = threading.Thread(target=run, args=(params,), name="model-warmup", daemon=True)
+    thread.start()
+    return thread
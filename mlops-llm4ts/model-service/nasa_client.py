@@ -0,0 +1,180 @@
+# nasa_client.py - Shared, resilient HTTP client for the NASA POWER API
+#
+# - one pooled keep-alive requests.Session per process
+# - connect/read timeouts on every call
+# - retries with exponential backoff + full jitter (connection errors, timeouts, 5xx, 429)
+# - optional hedging: if a call is slower than the recent latency percentile,
+#   a second identical request is sent and whichever answers first wins
+# - circuit breaker: after repeated failures calls fail fast for a cooldown
+#
+# NOTE: the same module is used by the inference service, the MLOps
+# retrainer (evaluation + training) and model-service/train.py; keep all
+# copies in sync.
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURATION ---
+NASA_CONNECT_TIMEOUT = float(os.getenv("NASA_CONNECT_TIMEOUT", "5"))
+NASA_READ_TIMEOUT = float(os.getenv("NASA_READ_TIMEOUT", "30"))
+NASA_MAX_RETRIES = int(os.getenv("NASA_MAX_RETRIES", "3"))
+NASA_BACKOFF_BASE = float(os.getenv("NASA_BACKOFF_BASE", "0.5"))
+NASA_BACKOFF_MAX = float(os.getenv("NASA_BACKOFF_MAX", "8"))
+# Hedge after this latency percentile of recent successful calls (0 disables)
+NASA_HEDGE_PERCENTILE = float(os.getenv("NASA_HEDGE_PERCENTILE", "95"))
+NASA_HEDGE_MIN_SAMPLES = int(os.getenv("NASA_HEDGE_MIN_SAMPLES", "20"))
+NASA_BREAKER_THRESHOLD = int(os.getenv("NASA_BREAKER_THRESHOLD", "5"))
+NASA_BREAKER_COOLDOWN = float(os.getenv("NASA_BREAKER_COOLDOWN", "30"))
+NASA_POOL_SIZE = int(os.getenv("NASA_POOL_SIZE", "16"))
+
+_LATENCY_SAMPLES = 200
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """NASA POWER has been failing; calls are rejected until the cooldown ends."""
+
+
+def _is_retryable(error):
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+class NasaPowerClient:
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=NASA_POOL_SIZE, pool_maxsize=NASA_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=NASA_POOL_SIZE, thread_name_prefix="nasa")
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._stats = {
+            "requests": 0, "successes": 0, "errors": 0, "retries": 0,
+            "hedges": 0, "hedge_wins": 0, "breaker_rejections": 0, "breaker_opens": 0,
+            "stale_served": 0,
+        }
+
+    # --- circuit breaker ---
+    def _check_breaker(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < NASA_BREAKER_COOLDOWN:
+                self._stats["breaker_rejections"] += 1
+                raise CircuitOpenError("NASA POWER circuit breaker is open")
+            # Cooldown over: let calls through (half-open); one failure re-opens it
+
+    def _on_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._stats["successes"] += 1
+
+    def _on_failure(self):
+        with self._lock:
+            self._stats["errors"] += 1
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= NASA_BREAKER_THRESHOLD:
+                if self._opened_at is None or time.monotonic() - self._opened_at >= NASA_BREAKER_COOLDOWN:
+                    self._stats["breaker_opens"] += 1
+                    logging.warning("NASA POWER circuit breaker opened")
+                self._opened_at = time.monotonic()
+
+    # --- single attempt / hedging ---
+    def _attempt(self, url):
+        started = time.perf_counter()
+        response = self.session.get(url, timeout=(NASA_CONNECT_TIMEOUT, NASA_READ_TIMEOUT))
+        response.raise_for_status()
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+        return response.text
+
+    def _hedge_delay(self):
+        with self._lock:
+            if NASA_HEDGE_PERCENTILE <= 0 or len(self._latencies) < NASA_HEDGE_MIN_SAMPLES:
+                return None
+            return float(np.percentile(self._latencies, NASA_HEDGE_PERCENTILE))
+
+    def _hedged(self, url):
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._attempt(url)
+
+        first = self._hedge_pool.submit(self._attempt, url)
+        if wait([first], timeout=delay).done:
+            return first.result()
+
+        with self._lock:
+            self._stats["hedges"] += 1
+        second = self._hedge_pool.submit(self._attempt, url)
+        for future in as_completed([first, second]):
+            if future.exception() is None:
+                if future is second:
+                    with self._lock:
+                        self._stats["hedge_wins"] += 1
+                return future.result()
+        raise first.exception()
+
+    # --- public API ---
+    def get_text(self, url):
+        """GET `url` and return the body text, with timeouts, retries, hedging and breaker."""
+        self._check_breaker()
+        with self._lock:
+            self._stats["requests"] += 1
+
+        for attempt in range(NASA_MAX_RETRIES + 1):
+            if attempt:
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(random.uniform(0, min(NASA_BACKOFF_MAX, NASA_BACKOFF_BASE * 2 ** (attempt - 1))))
+            try:
+                text = self._hedged(url)
+                self._on_success()
+                return text
+            except requests.exceptions.RequestException as e:
+                if not _is_retryable(e):
+                    # 4xx: our request is wrong, NASA itself is fine
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    raise
+                if attempt == NASA_MAX_RETRIES:
+                    self._on_failure()
+                    raise
+                logging.warning(f"NASA POWER request failed (attempt {attempt + 1}): {e}")
+
+    def count(self, name):
+        """Bump a caller-side counter (e.g. stale data served instead of a fetch)."""
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            latencies_ms = np.array(self._latencies) * 1000.0
+            return dict(
+                self._stats,
+                breaker_open=self._opened_at is not None,
+                latency_ms_p50=float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0,
+                latency_ms_p99=float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else 0.0,
+            )
+
+
+# Process-wide client (one connection pool, one breaker)
+client = NasaPowerClient()
+
+
+def get_text(url):
+    return client.get_text(url)
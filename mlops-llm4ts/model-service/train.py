@@ -1,13 +1,14 @@
-import requests
-import pandas as pd
 import numpy as np
-from io import StringIO
 from datetime import datetime, timedelta
 import torch
 import torch.nn as nn
 from torch.utils.data import DataLoader, TensorDataset
 from transformers import GPT2Model, GPT2Config
 
+from windowing import sliding_windows
+import nasa_client
+import nasa_parser
+
 # Parameters
 patch_length = 10
 D = 768  # Embedding dimension
@@ -40,19 +41,17 @@ url = url_template.format(
     param=param, lon=district["lon"], lat=district["lat"],
     start=start_date_str, end=end_date_str
 )
-response = requests.get(url)
-if response.status_code != 200:
-    raise Exception(f"Failed to fetch data: {response.status_code}")
-
-# Parse T2M data
-data_df = pd.read_csv(StringIO(response.text), skiprows=9)
-data_df.columns = [col.strip() for col in data_df.columns]
-data_df['Date'] = pd.to_datetime(
-    data_df['YEAR'].astype(str) + data_df['DOY'].astype(str).str.zfill(3),
-    format='%Y%j'
-)
-data_df.set_index('Date', inplace=True)
-t2m_series = data_df["T2M"].values.astype(np.float32)
+# Shared client: timeouts, retries with backoff and the circuit breaker
+text = nasa_client.get_text(url)
+
+# Parse T2M data (-999 "missing" arrives as NaN; fill gaps by interpolation)
+dates, values = nasa_parser.parse_csv(text, [param])
+t2m_series = values[param].astype(np.float32)
+missing = np.isnan(t2m_series)
+if missing.all():
+    raise Exception(f"No {param} values in the NASA POWER response")
+if missing.any():
+    t2m_series[missing] = np.interp(dates[missing], dates[~missing], t2m_series[~missing])
 
 # --- NORMALIZATION ---
 data_mean = t2m_series.mean()
@@ -61,13 +60,8 @@ data = (t2m_series - data_mean) / data_std
 
 # --- SLIDING WINDOW CREATION ---
 def create_sliding_windows(data, look_back, forecast_horizon):
-    X, y = [], []
-    for i in range(len(data) - look_back - forecast_horizon):
-        X.append(data[i:i + look_back])
-        y.append(data[i + look_back:i + look_back + forecast_horizon])
-    X = np.array(X)
-    y = np.array(y)
-    return torch.tensor(X, dtype=torch.float32), torch.tensor(y, dtype=torch.float32)
+    # Strided views over `data` (see windowing.py), no per-window copies
+    return sliding_windows(data, look_back, forecast_horizon)
 
 X, y = create_sliding_windows(data, T_in, T_out)
 
@@ -0,0 +1,37 @@
+# windowing.py - Zero-copy sliding windows over a 1-D series
+#
+# Every (input, target) pair of a series is a slice of the same buffer, so
+# instead of materialising N x (T_IN + T_OUT) floats the windows are strided
+# views: torch.from_numpy shares the NumPy buffer and Tensor.unfold only
+# changes strides. Memory stays O(N) however long the history or window.
+# Batches are only copied when the DataLoader stacks them.
+#
+# The views alias the series: don't modify either in place while they're in use.
+
+import numpy as np
+import torch
+
+
+def window_count(length, t_in, t_out, stride=1):
+    """Number of complete (t_in + t_out) windows in a series of `length`."""
+    span = t_in + t_out
+    return max(0, (length - span) // stride + 1)
+
+
+def sliding_windows(series, t_in, t_out, stride=1):
+    """
+    (X, y) views of shape [N, t_in] and [N, t_out] over `series`; window i
+    starts at i * stride. float32 inputs are not copied (other dtypes are
+    converted once).
+    """
+    if t_in < 1 or t_out < 0 or stride < 1:
+        raise ValueError(f"Invalid window: t_in={t_in}, t_out={t_out}, stride={stride}")
+    values = torch.from_numpy(np.ascontiguousarray(series, dtype=np.float32))
+    span = t_in + t_out
+    if values.ndim != 1:
+        raise ValueError(f"Expected a 1-D series, got shape {tuple(values.shape)}")
+    if len(values) < span:
+        empty = values.new_empty((0, span))
+        return empty[:, :t_in], empty[:, t_in:]
+    windows = values.unfold(0, span, stride)
+    return windows[:, :t_in], windows[:, t_in:]